@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # Never open a real window
+
+import numpy as np
+
+import core
+from crossings import CrossingIndex
+from parallel import CrossingPool
+from profiler import CallCounter
+
+# Headless benchmarks for puzzle generation, crossing counting, dragging and
+# drawing. Every stage runs at each node count with a fixed seed and reports
+# the best wall time, do_lines_intersect calls, segment pairs tested by the
+# batch kernels and the peak traced memory. Results are written as JSON, and
+# --compare checks them against an earlier run.
+#
+#   python bench.py --output bench_output.txt
+#   python bench.py --compare bench_output.txt
+
+DEFAULT_COUNTS = [10, 30, 100, 300, 1000, 3000, 10000]
+DRAG_STEPS = 20
+FRAMES = 10
+
+def measure(function, repeat):
+    """Return (best seconds, peak traced bytes, call counts) for function()."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+        if times[-1] > 1:
+            break  # Slow stages are only timed once
+
+    # Counting and tracing both slow things down, so they get their own run
+    with CallCounter() as counter:
+        tracemalloc.start()
+        try:
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return min(times), peak, counter.counts
+
+def make_puzzle(count, width, seed, node_type=core.Node):
+    nodes = core.generate_nodes(count, width, seed, node_type)
+    core.connect_nodes(nodes, seed)
+    return nodes
+
+def scrambled(count, width, height, seed, node_type=core.Node):
+    nodes = make_puzzle(count, width, seed, node_type)
+    core.arrange_nodes_in_circle(nodes, width, height)
+    return nodes
+
+def stages(count, width, height, seed, render, pool=None):
+    """Yield (stage, layout, operations, setup, function) for one node count.
+
+    setup is called, untimed, only if the stage is run, and function is
+    then called with its result.
+    """
+    yield 'generate', 'solved', 1, None, lambda _: make_puzzle(count, width, seed)
+
+    solved = make_puzzle(count, width, seed)
+    tangled = scrambled(count, width, height, seed)
+    for layout, nodes in (('solved', solved), ('scrambled', tangled)):
+        yield 'count_overlaps', layout, 1, None, lambda _, nodes=nodes: core.count_overlaps(nodes)
+        yield 'is_solved', layout, 1, None, lambda _, nodes=nodes: core.is_solved(nodes)
+        if pool is not None:
+            yield 'count_overlaps_parallel', layout, 1, None, lambda _, nodes=nodes: core.count_overlaps(nodes, pool)
+            yield 'is_solved_parallel', layout, 1, None, lambda _, nodes=nodes: core.is_solved(nodes, pool)
+    radius = core.node_radius(count)
+
+    def build_index():
+        return CrossingIndex(tangled, core.make_spatial_grid(tangled, width, radius))
+    yield 'crossing_index', 'scrambled', 1, None, lambda _: build_index()
+
+    rng = random.Random(seed)
+
+    def drag(index):
+        for _ in range(DRAG_STEPS):
+            node = tangled[rng.randrange(count)]
+            node.x, node.y = rng.uniform(0, width), rng.uniform(0, height)
+            index.move_node(node)
+    yield 'move_node', 'scrambled', DRAG_STEPS, build_index, drag
+
+    if render:
+        yield from frame_stages(count, width, height, seed)
+
+def frame_stages(count, width, height, seed):
+    import pygame
+    import logic
+
+    logic.init_display()
+    logic.set_node_count(count)
+    nodes = scrambled(count, width, height, seed, logic.Node)
+    selected = nodes[0]
+    selected.dragging = selected.highlighted = True
+    for node in selected.connections:
+        node.highlighted = True
+    rng = random.Random(seed)
+    index = {}
+
+    def setup():
+        # Shared by both frame stages, and only built if one of them runs
+        if not index:
+            index['index'] = CrossingIndex(nodes)
+        return index['index']
+
+    def frames(index, layer):
+        for _ in range(FRAMES):
+            selected.x, selected.y = rng.uniform(0, width), rng.uniform(0, height)
+            index.move_node(selected)
+            dirty = logic.draw_nodes_and_connections(nodes, None, 0.5, 12.0, True, index, layer)
+            if layer is None:
+                pygame.display.flip()
+            else:
+                layer.present(dirty)
+
+    layer = logic.SceneLayer()
+    yield 'frame', 'scrambled', FRAMES, setup, lambda index: frames(index, None)
+    yield 'frame_layered', 'scrambled', FRAMES, setup, lambda index: frames(index, layer)
+
+def run(counts, width, height, seed, repeat, budget, render, pool=None):
+    results = []
+    previous = {}  # Stage -> (count, seconds) of its last run, to skip hopeless ones
+    for count in counts:
+        for stage, layout, operations, setup, function in stages(count, width, height, seed, render, pool):
+            key = (stage, layout)
+            row = {'count': count, 'stage': stage, 'layout': layout, 'operations': operations}
+            if key in previous:
+                last_count, last_seconds = previous[key]
+                estimate = last_seconds * (count / last_count) ** 2  # Assume the worst, quadratic
+                if estimate > budget:
+                    row.update(skipped=True, estimate_seconds=estimate)
+                    results.append(row)
+                    print(f"{count:>6} {stage:<23} {layout:<9} skipped, about {estimate:.0f} s", file=sys.stderr)
+                    continue
+            prepared = setup() if setup else None
+            seconds, peak, calls = measure(lambda: function(prepared), repeat)
+            previous[key] = (count, seconds)
+            row.update(seconds=seconds, seconds_per_operation=seconds / operations, peak_bytes=peak, **calls)
+            results.append(row)
+            print(f"{count:>6} {stage:<23} {layout:<9} {seconds * 1000:>10.2f} ms {peak / 2**20:>9.1f} MiB "
+                  f"{calls['do_lines_intersect']:>10} calls {calls['kernel_pair_tests']:>12} pair tests",
+                  file=sys.stderr)
+    return results
+
+def compare(results, baseline, tolerance):
+    """Print stages that got slower than tolerance times the baseline and return how many."""
+    before = {(row['count'], row['stage'], row['layout']): row for row in baseline['results']}
+    regressions = 0
+    for row in results:
+        old = before.get((row['count'], row['stage'], row['layout']))
+        if old is None or 'seconds' not in row or 'seconds' not in old:
+            continue
+        ratio = row['seconds'] / max(old['seconds'], 1e-9)
+        if ratio > tolerance:
+            regressions += 1
+            print(f"slower: {row['count']} {row['stage']} {row['layout']} "
+                  f"{old['seconds'] * 1000:.2f} ms -> {row['seconds'] * 1000:.2f} ms ({ratio:.2f}x)", file=sys.stderr)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark puzzle generation, crossing counting and drawing.")
+    parser.add_argument('--counts', type=int, nargs='+', default=DEFAULT_COUNTS, help="node counts to run")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--size', type=int, nargs=2, default=(1920, 1080), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage, the best is kept")
+    parser.add_argument('--budget', type=float, default=60,
+                        help="skip a stage once it is expected to take longer than this many seconds")
+    parser.add_argument('--no-render', action='store_true', help="skip the pygame frame stages")
+    parser.add_argument('--workers', type=int, help="also time count_overlaps and is_solved on this many workers")
+    parser.add_argument('--output', help="write the JSON results here instead of stdout")
+    parser.add_argument('--compare', help="earlier JSON results to check for slowdowns")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    width, height = args.size
+    with CrossingPool(args.workers) as pool:
+        results = run(args.counts, width, height, args.seed, args.repeat, args.budget, not args.no_render,
+                      pool if args.workers else None)
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'size': [width, height],
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
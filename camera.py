@@ -0,0 +1,53 @@
+import numpy as np
+
+# The view onto the puzzle. Nodes keep their positions in puzzle
+# coordinates, which at zoom 1 with no panning are screen pixels; the camera
+# maps them to the screen as (position - origin) * zoom. The functions here
+# take scalars or numpy arrays alike.
+
+MIN_ZOOM = 0.5
+MAX_ZOOM = 64
+ZOOM_STEP = 1.25  # Zoom change per mouse wheel notch
+
+class Camera:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.reset()
+
+    def reset(self):
+        """Show the whole play area at 1:1."""
+        self.zoom = 1.0
+        self.x = 0.0  # Puzzle coordinates of the top left of the screen
+        self.y = 0.0
+
+    @property
+    def key(self):
+        """Changes whenever the view does, for caches drawn through the camera."""
+        return (self.zoom, self.x, self.y)
+
+    def to_screen(self, x, y):
+        return (x - self.x) * self.zoom, (y - self.y) * self.zoom
+
+    def to_world(self, x, y):
+        return x / self.zoom + self.x, y / self.zoom + self.y
+
+    def pan(self, dx, dy):
+        """Move the view by a drag of (dx, dy) screen pixels."""
+        self.x -= dx / self.zoom
+        self.y -= dy / self.zoom
+
+    def zoom_at(self, pos, factor):
+        """Zoom by factor, keeping the point under the screen position pos where it is."""
+        x, y = self.to_world(*pos)
+        self.zoom = min(max(self.zoom * factor, MIN_ZOOM), MAX_ZOOM)
+        self.x = x - pos[0] / self.zoom
+        self.y = y - pos[1] / self.zoom
+
+    def visible_segments(self, coords, margin=0):
+        """Return a mask of the (x1, y1, x2, y2) screen rows whose bounding box
+        comes within margin pixels of the screen.
+        """
+        x1, y1, x2, y2 = coords.T
+        return ((np.maximum(x1, x2) >= -margin) & (np.minimum(x1, x2) <= self.width + margin) &
+                (np.maximum(y1, y2) >= -margin) & (np.minimum(y1, y2) <= self.height + margin))
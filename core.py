@@ -0,0 +1,96 @@
+import math
+import random
+
+import numpy as np
+
+from crossings import crossing_edges, has_crossing
+from generator import planar_edges
+from graph import Graph, NodeView
+from spatial import SpatialGrid
+
+# Puzzle logic with no display. Everything that depends on the screen or the
+# node count takes it as a parameter, so this module (and the modules it
+# uses) can be imported by tools and tests without pygame.
+
+def node_radius(node_count):
+    return 30 / math.log(node_count + 1)
+
+class Node(NodeView):
+    __slots__ = ()
+
+    def is_hovered(self, pos, radius):
+        return math.hypot(pos[0] - self.x, pos[1] - self.y) <= radius
+
+def generate_nodes(node_count, width, seed=None, node_type=Node):
+    rng = random.Random(seed)
+    grid_size = 2 * math.ceil(math.sqrt(node_count))
+    spacing = width // grid_size  # Size of each grid cell
+
+    # Pick distinct grid cells without building the whole grid
+    cells = np.array(rng.sample(range(grid_size * grid_size), node_count), dtype=np.int64)
+    xs = spacing // 2 + (cells // grid_size) * spacing
+    ys = spacing // 2 + (cells % grid_size) * spacing
+    return Graph(xs, ys, node_type)
+
+def arrange_nodes_in_circle(nodes, width, height):
+    # Arrange nodes in a circle
+    angle_step = 2 * math.pi / len(nodes)
+    radius = height // 3  # Dynamic radius based on screen height
+    center_x, center_y = width // 2, height // 2
+
+    for i, node in enumerate(nodes):
+        angle = i * angle_step
+        node.x = int(center_x + radius * math.cos(angle))
+        node.y = int(center_y + radius * math.sin(angle))
+
+def generate_puzzle(node_count, width, height, seed=None, node_type=Node):
+    """Return a new scrambled puzzle: generated, connected and arranged in a circle."""
+    nodes = generate_nodes(node_count, width, seed, node_type)
+    connect_nodes(nodes, seed)
+    arrange_nodes_in_circle(nodes, width, height)
+    return nodes
+
+def make_spatial_grid(nodes, width, radius):
+    # Cells match the spacing generate_nodes places nodes at, but are never
+    # smaller than a node so picking only looks at a few cells
+    spacing = width / (2 * math.ceil(math.sqrt(len(nodes))))
+    return SpatialGrid(nodes, max(spacing, 2 * radius))
+
+def find_hovered_node(grid, pos, radius):
+    hovered = [node for node in grid.nodes_near(pos, radius) if node.is_hovered(pos, radius)]
+    return min(hovered, key=lambda node: node.index, default=None)
+
+def nodes_in_box(nodes, corner, other_corner):
+    """Return the indices of the nodes inside the box with two opposite corners."""
+    (x1, y1), (x2, y2) = corner, other_corner
+    inside = ((nodes.xs >= min(x1, x2)) & (nodes.xs <= max(x1, x2)) &
+              (nodes.ys >= min(y1, y2)) & (nodes.ys <= max(y1, y2)))
+    return np.flatnonzero(inside)
+
+def connect_nodes(nodes, seed=None):
+    # The edges come from a triangulation of the node positions, so the
+    # generated layout never has crossings and generation always finishes
+    points = list(zip(nodes.xs.tolist(), nodes.ys.tolist()))
+    for a, b in planar_edges(points, random.Random(seed)):
+        nodes.connect(a, b)
+
+def is_solved(nodes, pool=None):
+    # pool is an optional parallel.CrossingPool, for very large graphs
+    return not (pool.has_crossing(nodes) if pool else has_crossing(nodes))
+
+def count_overlaps(nodes, pool=None):
+    # Number of edges that cross at least one other edge
+    return len(pool.crossing_edges(nodes) if pool else crossing_edges(nodes))
+
+def print_node_connection_counts(nodes):
+    connection_counts = {}
+    for node in nodes:
+        count = len(node.connections)
+        if count not in connection_counts:
+            connection_counts[count] = 0
+        connection_counts[count] += 1
+
+    # Print the results
+    print("Node Connection Counts:")
+    for connection_count, node_count in sorted(connection_counts.items()):
+        print(f"{node_count} nodes with {connection_count} connections")
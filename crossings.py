@@ -0,0 +1,415 @@
+import heapq
+import math
+from fractions import Fraction
+import numpy as np
+import kernels
+
+# Sweep-line crossing detection.
+#
+# Edges are swept from left to right, with points that share an x coordinate
+# swept from bottom to top (the same as sweeping a very slightly rotated
+# line). This lets vertical edges, edges meeting at a node and collinear
+# overlaps be handled the same way as ordinary crossings. Node positions are
+# scaled to integers and intersection points are kept as exact homogeneous
+# (X, Y, W) triples, so the results always agree with do_lines_intersect.
+
+def do_lines_intersect(x1, y1, x2, y2, x3, y3, x4, y4):
+    def orientation(p, q, r):
+        """Calculate the orientation of the triplet (p, q, r).
+        0 -> p, q and r are collinear
+        1 -> Clockwise
+        2 -> Counterclockwise
+        """
+        val = (q[1] - p[1]) * (r[0] - q[0]) - (q[0] - p[0]) * (r[1] - q[1])
+        if val == 0:
+            return 0
+        return 1 if val > 0 else 2
+
+    def on_segment(p, q, r):
+        """Check if point q lies on segment pr"""
+        if (min(p[0], r[0]) <= q[0] <= max(p[0], r[0]) and
+                min(p[1], r[1]) <= q[1] <= max(p[1], r[1])):
+            return True
+        return False
+
+    # Convert coordinates into points for easier handling
+    p1, q1 = (x1, y1), (x2, y2)
+    p2, q2 = (x3, y3), (x4, y4)
+
+    # Find the four orientations needed for the general and special cases
+    o1 = orientation(p1, q1, p2)
+    o2 = orientation(p1, q1, q2)
+    o3 = orientation(p2, q2, p1)
+    o4 = orientation(p2, q2, q1)
+
+    # General case: lines intersect if orientations are different
+    if o1 != o2 and o3 != o4:
+        return True
+
+    # Special cases: Check if the points are collinear and lie on the segments
+    if o1 == 0 and on_segment(p1, p2, q1):
+        return True
+    if o2 == 0 and on_segment(p1, q2, q1):
+        return True
+    if o3 == 0 and on_segment(p2, p1, q2):
+        return True
+    if o4 == 0 and on_segment(p2, q1, q2):
+        return True
+
+    # Otherwise, the lines do not intersect
+    return False
+
+class _Segment:
+    __slots__ = ('x1', 'y1', 'x2', 'y2', 'dx', 'dy', 'slope', 'edge')
+
+    def __init__(self, p, q, edge):
+        # p is always the endpoint that is swept first
+        self.x1, self.y1 = p
+        self.x2, self.y2 = q
+        self.dx = self.x2 - self.x1
+        self.dy = self.y2 - self.y1
+        self.edge = edge
+        if self.dx == 0:
+            self.slope = (1, 0)  # Vertical edges sort above everything else
+        else:
+            self.slope = (0, Fraction(self.dy, self.dx))
+
+def _side(segment, x, y, w=1):
+    """Return the sign of (y of segment at x/w) - y/w."""
+    if segment.dx == 0:
+        # A vertical segment in the status always contains the event point
+        return 0
+    value = (segment.y1 * w - y) * segment.dx + (x - segment.x1 * w) * segment.dy
+    return (value > 0) - (value < 0)
+
+def _adjacent(s, t):
+    a, b = s.edge
+    return a in t.edge or b in t.edge
+
+def _touch(s, t):
+    return do_lines_intersect(s.x1, s.y1, s.x2, s.y2, t.x1, t.y1, t.x2, t.y2)
+
+def _pair(s, t):
+    return (s.edge, t.edge) if s.edge < t.edge else (t.edge, s.edge)
+
+def _intersection_event(s, t):
+    """Return the queue entry for the point where two touching segments cross, or None if they are parallel."""
+    w = s.dx * t.dy - s.dy * t.dx
+    if w == 0:
+        return None
+    ratio = (t.x1 - s.x1) * t.dy - (t.y1 - s.y1) * t.dx
+    x = s.x1 * w + ratio * s.dx
+    y = s.y1 * w + ratio * s.dy
+    if w < 0:
+        x, y, w = -x, -y, -w
+    return (Fraction(x, w), Fraction(y, w), x, y, w)
+
+def _integer_positions(nodes):
+    """Return [(x, y)] by node index with every position scaled by the same factor onto integers."""
+    if np.array_equal(nodes.xs, np.floor(nodes.xs)) and np.array_equal(nodes.ys, np.floor(nodes.ys)):
+        return list(zip(nodes.xs.astype(np.int64).tolist(), nodes.ys.astype(np.int64).tolist()))
+    exact = []
+    scale = 1
+    for position in zip(nodes.xs.tolist(), nodes.ys.tolist()):
+        point = []
+        for value in position:
+            if value == int(value):
+                point.append(int(value))
+            else:
+                value = Fraction(value)
+                scale = math.lcm(scale, value.denominator)
+                point.append(value)
+        exact.append(point)
+    return [(int(x * scale), int(y * scale)) for x, y in exact]
+
+def _edge_segments(nodes):
+    positions = _integer_positions(nodes)
+    segments = []
+    for edge in map(tuple, nodes.edges.tolist()):
+        p, q = positions[edge[0]], positions[edge[1]]
+        segments.append(_Segment(p, q, edge) if p <= q else _Segment(q, p, edge))
+    return segments
+
+def _events(segments):
+    starts = {}
+    points = {}  # Zero-length edges (a node dropped on top of its neighbour)
+    for segment in segments:
+        p, q = (segment.x1, segment.y1), (segment.x2, segment.y2)
+        if p == q:
+            points.setdefault(p, []).append(segment)
+        else:
+            starts.setdefault(p, []).append(segment)
+    return starts, points, starts.keys() | points.keys() | {(s.x2, s.y2) for s in segments}
+
+def _through(status, x, y, w=1):
+    """Return the slice bounds of the status segments passing through (x/w, y/w)."""
+    lo, hi = 0, len(status)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _side(status[mid], x, y, w) < 0:
+            lo = mid + 1
+        else:
+            hi = mid
+    end = lo
+    while end < len(status) and _side(status[end], x, y, w) == 0:
+        end += 1
+    return lo, end
+
+def _sweep(segments):
+    """Yield every pair of non-adjacent segments that touch, as (edge, edge) tuples.
+
+    This is the Bentley-Ottmann algorithm. The first pair is yielded before
+    any intersection event is queued, so stopping after it gives the
+    Shamos-Hoey test.
+    """
+    starts, points, endpoints = _events(segments)
+    queue = [(x, y, x, y, 1) for x, y in endpoints]
+    queued = set(endpoints)
+    heapq.heapify(queue)
+    status = []
+
+    while queue:
+        px, py, x, y, w = heapq.heappop(queue)
+        p = (px, py)
+        lo, end = _through(status, x, y, w)
+        through = status[lo:end]
+
+        # Every non-adjacent pair meeting at p touches there
+        group = starts.get(p, []) + through + points.get(p, [])
+        for i in range(len(group)):
+            for j in range(i + 1, len(group)):
+                if not _adjacent(group[i], group[j]):
+                    yield _pair(group[i], group[j])
+
+        # Re-insert the segments continuing past p in their new order
+        continuing = [s for s in through if (s.x2, s.y2) != p] + starts.get(p, [])
+        continuing.sort(key=lambda s: s.slope)
+        status[lo:end] = continuing
+
+        if continuing:
+            neighbours = []
+            if lo > 0:
+                neighbours.append((status[lo - 1], continuing[0]))
+            if lo + len(continuing) < len(status):
+                neighbours.append((continuing[-1], status[lo + len(continuing)]))
+        elif 0 < lo < len(status):
+            neighbours = [(status[lo - 1], status[lo])]
+        else:
+            neighbours = []
+        for s, t in neighbours:
+            if _adjacent(s, t) or not _touch(s, t):
+                continue
+            yield _pair(s, t)
+            event = _intersection_event(s, t)
+            if event is not None and event[:2] > p and event[:2] not in queued:
+                queued.add(event[:2])
+                heapq.heappush(queue, event)
+
+def _marking_sweep(segments):
+    """Return the set of edges found crossing by a Shamos-Hoey sweep that drops
+    both edges of a crossing as soon as it is found.
+
+    Dropping them means the status never holds two crossing segments, so no
+    intersection events are needed. The edges left unmarked never cross each
+    other, though they may still cross a marked edge.
+    """
+    starts, points, endpoints = _events(segments)
+    marked = set()
+    status = []
+
+    def settle(i):
+        # Check the neighbours meeting at index i, dropping crossing pairs
+        while 0 < i < len(status):
+            s, t = status[i - 1], status[i]
+            if _adjacent(s, t) or not _touch(s, t):
+                break
+            marked.add(s.edge)
+            marked.add(t.edge)
+            del status[i - 1:i + 1]
+            i -= 1
+        return i
+
+    for p in sorted(endpoints):
+        lo, end = _through(status, *p)
+        through = status[lo:end]
+
+        group = starts.get(p, []) + through + points.get(p, [])
+        for i in range(len(group)):
+            for j in range(i + 1, len(group)):
+                if not _adjacent(group[i], group[j]):
+                    marked.add(group[i].edge)
+                    marked.add(group[j].edge)
+
+        continuing = [s for s in through + starts.get(p, [])
+                      if (s.x2, s.y2) != p and s.edge not in marked]
+        continuing.sort(key=lambda s: s.slope)
+        status[lo:end] = continuing
+
+        top = settle(lo + len(continuing))
+        if continuing and top > lo:
+            settle(lo)
+    return marked
+
+def crossing_counts(nodes):
+    """Return an array with the number of edges crossing each row of nodes.edges.
+
+    Edges that share a node are never counted as crossing each other. A
+    tangled puzzle's crossings are counted batch by batch and never held
+    all at once.
+    """
+    segments = _edge_segments(nodes)
+    coords, ends = kernels.edge_arrays(nodes)
+    # Bentley-Ottmann pays for every crossing, so once more than an eighth of
+    # the edges cross (a freshly scrambled puzzle) the batched all-pairs
+    # kernel is faster
+    if len(_marking_sweep(segments)) * 8 > len(segments):
+        return kernels.crossing_counts(coords, ends)
+    rows = {tuple(edge): row for row, edge in enumerate(ends.tolist())}
+    counts = np.zeros(len(ends), dtype=np.int64)
+    for first, second in set(_sweep(segments)):
+        counts[rows[first]] += 1
+        counts[rows[second]] += 1
+    return counts
+
+def crossing_edges(nodes, rows_crossing=kernels.rows_crossing):
+    """Return the set of edges that cross at least one other edge.
+
+    rows_crossing does the last step, testing the edges the sweep left
+    unmarked; parallel.CrossingPool passes one that spreads it over workers.
+    """
+    marked = _marking_sweep(_edge_segments(nodes))
+    coords, ends = kernels.edge_arrays(nodes)
+    keys = [tuple(edge) for edge in ends.tolist()]
+    is_marked = np.array([key in marked for key in keys], dtype=bool)
+    if is_marked.all() or not is_marked.any():
+        return marked
+
+    # Unmarked edges can only cross marked ones, so test just those pairs
+    unmarked = np.nonzero(~is_marked)[0]
+    hits = rows_crossing(coords, ends, unmarked, np.nonzero(is_marked)[0])
+    return marked | {keys[row] for row in unmarked[hits]}
+
+def has_crossing(nodes):
+    """Return True as soon as any two edges are found to cross."""
+    return next(_sweep(_edge_segments(nodes)), None) is not None
+
+class CrossingIndex:
+    """How many edges cross each edge of a node graph, kept up to date as nodes move.
+
+    This is the one crossing result the game keeps: the progress bar, solved
+    detection and Peek Knots all read it, and it only changes when a node is
+    moved. A new or loaded game gets a new index. Moving a node only retests
+    the edges incident to it: their crossings are found at the old position
+    and taken off the counts, then found at the new one and added. If a
+    SpatialGrid is given, only the edges sharing a grid cell are retested
+    and the grid is moved along with the nodes.
+
+    Only a count per edge is stored, never the crossing pairs, so memory
+    stays linear in the number of edges however tangled the puzzle is.
+    """
+
+    def __init__(self, nodes, grid=None, counts=None):
+        self.grid = grid
+        self.coords, self.ends = kernels.edge_arrays(nodes)
+        self.keys = [tuple(edge) for edge in self.ends.tolist()]
+        self.rows = {key: row for row, key in enumerate(self.keys)}  # In the same order as nodes.edges
+        # Edges crossing each row, unless they were counted already (a cached puzzle)
+        self.counts = crossing_counts(nodes) if counts is None else np.array(counts, dtype=np.int64)
+        self.overlaps = int(np.count_nonzero(self.counts))  # Number of edges crossing at least one other edge
+        self.changed = set()  # Rows that started or stopped crossing since the owner last cleared this
+
+    def crossings(self, node1, node2):
+        """Return the number of edges crossing the edge between two nodes."""
+        edge = (node1.index, node2.index) if node1.index < node2.index else (node2.index, node1.index)
+        return int(self.counts[self.rows[edge]])
+
+    def is_crossing(self, node1, node2):
+        return self.crossings(node1, node2) > 0
+
+    def crossing_mask(self):
+        """Return a boolean array marking the rows that cross at least one other edge."""
+        return self.counts > 0
+
+    def _hits(self, row):
+        """Return the rows crossing row at the positions the index holds now."""
+        if self.grid:
+            x1, y1, x2, y2 = self.coords[row]
+            candidates = np.array([self.rows[min(a.index, b.index), max(a.index, b.index)]
+                                   for a, b in self.grid.edge_candidates(x1, y1, x2, y2)], dtype=np.int64)
+        else:
+            candidates = np.arange(len(self.keys))
+        return candidates[kernels.segment_crossings(self.coords[candidates], self.ends[candidates],
+                                                    self.coords[row], self.ends[row])]
+
+    def move_node(self, node):
+        """Update the index after node has moved."""
+        rows = np.array([self.rows[(node.index, other) if node.index < other else (other, node.index)]
+                         for other in node.graph.neighbours(node.index)], dtype=np.int64)
+        # Edges sharing the node never cross each other, so none of these
+        # hits is one of the moved rows
+        before = [self._hits(row) for row in rows.tolist()]
+
+        if self.grid:
+            self.grid.move_node(node)
+        xs, ys = node.graph.xs, node.graph.ys
+        first, second = self.ends[rows, 0], self.ends[rows, 1]
+        self.coords[rows] = np.column_stack((xs[first], ys[first], xs[second], ys[second]))
+        after = [self._hits(row) for row in rows.tolist()]
+
+        touched = np.unique(np.concatenate([rows, *before, *after]))
+        was = self.counts[touched] > 0
+        for hits in before:
+            self.counts[hits] -= 1
+        for hits in after:
+            self.counts[hits] += 1
+        self.counts[rows] = [len(hits) for hits in after]
+        now = self.counts[touched] > 0
+        self.overlaps += int(np.count_nonzero(now)) - int(np.count_nonzero(was))
+        self.changed.update(touched[was != now].tolist())
+
+    def _group_pairs(self, rows, moving, inside):
+        """Return a (P, 2) array of the crossing pairs with an edge in rows, each pair once,
+        leaving out pairs of two inside edges.
+        """
+        if self.grid:
+            candidates = set()
+            for x1, y1, x2, y2 in self.coords[rows].tolist():
+                candidates.update(self.rows[min(a.index, b.index), max(a.index, b.index)]
+                                  for a, b in self.grid.edge_candidates(x1, y1, x2, y2))
+            candidates = np.array(sorted(candidates), dtype=np.int64)
+        else:
+            candidates = np.arange(len(self.keys))
+        i, j = kernels.pairs_crossing(self.coords, self.ends, rows, candidates)
+        first, second = rows[i], candidates[j]
+        # A pair of two moving edges is found from both sides
+        keep = ~(inside[first] & inside[second]) & (~moving[second] | (first < second))
+        return np.column_stack((first[keep], second[keep]))
+
+    def move_nodes(self, graph, indices):
+        """Update the index after the nodes in indices have all moved by the same offset.
+
+        Only the edges touching the moved nodes are retested. An edge with
+        both ends in the group moved along with it, so the crossings between
+        two such edges cannot have changed and are never tested.
+        """
+        moved = np.zeros(len(graph), dtype=bool)
+        moved[indices] = True
+        moving = moved[self.ends[:, 0]] | moved[self.ends[:, 1]]
+        inside = moved[self.ends[:, 0]] & moved[self.ends[:, 1]]
+        rows = np.flatnonzero(moving)
+        before = self._group_pairs(rows, moving, inside)
+
+        if self.grid:
+            for index in np.asarray(indices).tolist():
+                self.grid.move_node(graph[index])
+        first, second = self.ends[rows, 0], self.ends[rows, 1]
+        self.coords[rows] = np.column_stack((graph.xs[first], graph.ys[first], graph.xs[second], graph.ys[second]))
+        after = self._group_pairs(rows, moving, inside)
+
+        touched = np.unique(np.concatenate([before.ravel(), after.ravel()]))
+        was = self.counts[touched] > 0
+        np.subtract.at(self.counts, before.ravel(), 1)
+        np.add.at(self.counts, after.ravel(), 1)
+        now = self.counts[touched] > 0
+        self.overlaps += int(np.count_nonzero(now)) - int(np.count_nonzero(was))
+        self.changed.update(touched[was != now].tolist())
@@ -0,0 +1,45 @@
+import pygame.event
+import pygame.time
+
+# Frame pacing for the main loop. While something is animating, frames come
+# at the target frame rate. Otherwise the loop sleeps in event.wait until
+# input arrives or until the next time the screen has to change (the timer
+# ticking over, a message running out), so an idle game uses no CPU. Runs of
+# mouse motion are cut down to their last position once per frame.
+
+DEFAULT_FPS = 60
+
+def coalesce_motion(events):
+    """Drop every MOUSEMOTION event that is directly followed by another one."""
+    kept = []
+    for event in events:
+        if event.type == pygame.MOUSEMOTION and kept and kept[-1].type == pygame.MOUSEMOTION:
+            kept[-1] = event
+        else:
+            kept.append(event)
+    return kept
+
+class FrameScheduler:
+    def __init__(self, fps=DEFAULT_FPS):
+        self.fps = fps
+        self.clock = pygame.time.Clock()
+
+    def next_frame(self, busy, wake_at=None):
+        """Wait for the next frame and return its events.
+
+        Frames are never closer together than the target frame rate. If
+        busy is false and no events are queued, this sleeps until one
+        arrives or until pygame.time.get_ticks() reaches wake_at.
+        """
+        self.clock.tick(self.fps)
+        events = []
+        if not busy and not pygame.event.peek():
+            if wake_at is None:
+                events.append(pygame.event.wait())
+            else:
+                timeout = wake_at - pygame.time.get_ticks()
+                if timeout > 0:
+                    event = pygame.event.wait(timeout)
+                    if event.type != pygame.NOEVENT:
+                        events.append(event)
+        return coalesce_motion(events + pygame.event.get())
@@ -0,0 +1,274 @@
+import math
+
+# Puzzle graph generation.
+#
+# The placed points are Delaunay triangulated with a radial sweep (the same
+# scheme as the delaunator library): points are added in order of distance
+# from a seed triangle, each one is joined to the hull edges it can see, and
+# edges are flipped until every triangle is Delaunay. A triangulation never
+# has crossing edges, so any subset of its edges is a solvable puzzle.
+
+def _cross(points, o, a, b):
+    """Positive if o -> a -> b turns counterclockwise."""
+    ox, oy = points[o]
+    ax, ay = points[a]
+    bx, by = points[b]
+    return (ax - ox) * (by - oy) - (ay - oy) * (bx - ox)
+
+def _in_circle(points, a, b, c, p):
+    """True if p is strictly inside the circumcircle of the counterclockwise triangle a, b, c."""
+    px, py = points[p]
+    dx, dy = points[a][0] - px, points[a][1] - py
+    ex, ey = points[b][0] - px, points[b][1] - py
+    fx, fy = points[c][0] - px, points[c][1] - py
+    ap = dx * dx + dy * dy
+    bp = ex * ex + ey * ey
+    cp = fx * fx + fy * fy
+    return dx * (ey * cp - bp * fy) - dy * (ex * cp - bp * fx) + ap * (ex * fy - ey * fx) > 0
+
+def _circumradius(ax, ay, bx, by, cx, cy):
+    dx, dy = bx - ax, by - ay
+    ex, ey = cx - ax, cy - ay
+    bl = dx * dx + dy * dy
+    cl = ex * ex + ey * ey
+    d = dx * ey - dy * ex
+    if d == 0:
+        return math.inf
+    x = (ey * bl - dy * cl) * 0.5 / d
+    y = (dx * cl - ex * bl) * 0.5 / d
+    return x * x + y * y
+
+def _circumcenter(ax, ay, bx, by, cx, cy):
+    dx, dy = bx - ax, by - ay
+    ex, ey = cx - ax, cy - ay
+    bl = dx * dx + dy * dy
+    cl = ex * ex + ey * ey
+    d = 0.5 / (dx * ey - dy * ex)
+    return ax + (ey * bl - dy * cl) * d, ay + (dx * cl - ex * bl) * d
+
+def _pseudo_angle(dx, dy):
+    # Monotonic in the true angle, but needs no trigonometry
+    p = dx / (abs(dx) + abs(dy))
+    return (3 - p if dy > 0 else 1 + p) / 4
+
+def triangulate(points):
+    """Return the edges of a Delaunay triangulation of points as (i, j) tuples, i < j.
+
+    points must be distinct. If they are all collinear the result is the
+    path through them.
+    """
+    count = len(points)
+    if count < 2:
+        return []
+
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    center_x = (min(xs) + max(xs)) / 2
+    center_y = (min(ys) + max(ys)) / 2
+
+    def distance(i, x, y):
+        return (points[i][0] - x) ** 2 + (points[i][1] - y) ** 2
+
+    # Seed triangle: the point nearest the centre, its nearest neighbour and
+    # the point making the smallest circumcircle with them
+    i0 = min(range(count), key=lambda i: distance(i, center_x, center_y))
+    i1 = min((i for i in range(count) if i != i0), key=lambda i: distance(i, *points[i0]))
+    i2 = min((i for i in range(count) if i not in (i0, i1)),
+             key=lambda i: _circumradius(*points[i0], *points[i1], *points[i]), default=None)
+    if i2 is None or _circumradius(*points[i0], *points[i1], *points[i2]) == math.inf:
+        # All collinear, so there are no triangles
+        order = sorted(range(count), key=lambda i: points[i])
+        return [(min(a, b), max(a, b)) for a, b in zip(order, order[1:])]
+    if _cross(points, i0, i1, i2) < 0:
+        i1, i2 = i2, i1
+
+    center_x, center_y = _circumcenter(*points[i0], *points[i1], *points[i2])
+    order = sorted(range(count), key=lambda i: distance(i, center_x, center_y))
+
+    hash_size = max(1, math.ceil(math.sqrt(count)))
+    hull_hash = [-1] * hash_size
+    hull_next = [0] * count
+    hull_prev = [0] * count
+    hull_tri = [0] * count  # Point -> half-edge of the hull edge starting there
+    triangles = []
+    halfedges = []
+    edge_stack = []
+
+    def hash_key(i):
+        x, y = points[i]
+        return int(_pseudo_angle(x - center_x, y - center_y) * hash_size) % hash_size
+
+    def link(a, b):
+        halfedges[a] = b
+        if b != -1:
+            halfedges[b] = a
+
+    def add_triangle(i, j, k, a, b, c):
+        t = len(triangles)
+        triangles.extend((i, j, k))
+        halfedges.extend((-1, -1, -1))
+        link(t, a)
+        link(t + 1, b)
+        link(t + 2, c)
+        return t
+
+    def legalize(a):
+        # Flip edges until the triangles around a are Delaunay again
+        nonlocal hull_start
+        while True:
+            b = halfedges[a]
+            a0 = a - a % 3
+            ar = a0 + (a + 2) % 3
+            if b == -1:
+                if not edge_stack:
+                    return ar
+                a = edge_stack.pop()
+                continue
+
+            b0 = b - b % 3
+            al = a0 + (a + 1) % 3
+            bl = b0 + (b + 2) % 3
+            p0, pr, pl, p1 = triangles[ar], triangles[a], triangles[al], triangles[bl]
+            if not _in_circle(points, p0, pr, pl, p1):
+                if not edge_stack:
+                    return ar
+                a = edge_stack.pop()
+                continue
+
+            triangles[a] = p1
+            triangles[b] = p0
+            hbl = halfedges[bl]
+            if hbl == -1:
+                # The flipped edge was on the hull, so fix the hull's reference to it
+                e = hull_start
+                while True:
+                    if hull_tri[e] == bl:
+                        hull_tri[e] = a
+                        break
+                    e = hull_prev[e]
+                    if e == hull_start:
+                        break
+            link(a, hbl)
+            link(b, halfedges[ar])
+            link(ar, bl)
+            edge_stack.append(b0 + (b + 1) % 3)
+
+    hull_start = i0
+    hull_next[i0] = hull_prev[i2] = i1
+    hull_next[i1] = hull_prev[i0] = i2
+    hull_next[i2] = hull_prev[i1] = i0
+    hull_tri[i0], hull_tri[i1], hull_tri[i2] = 0, 1, 2
+    for i in (i0, i1, i2):
+        hull_hash[hash_key(i)] = i
+    add_triangle(i0, i1, i2, -1, -1, -1)
+
+    for i in order:
+        if i in (i0, i1, i2):
+            continue
+
+        # Find a hull edge visible from the new point, starting near it
+        key = hash_key(i)
+        start = 0
+        for j in range(hash_size):
+            start = hull_hash[(key + j) % hash_size]
+            if start != -1 and start != hull_next[start]:
+                break
+        start = hull_prev[start]
+        e = start
+        while _cross(points, e, hull_next[e], i) >= 0:
+            e = hull_next[e]
+            if e == start:
+                e = -1
+                break
+        if e == -1:
+            continue  # Only possible for a point lying on the hull itself
+
+        t = add_triangle(e, i, hull_next[e], -1, -1, hull_tri[e])
+        hull_tri[i] = legalize(t + 2)
+        hull_tri[e] = t
+
+        # Walk forward along the hull, adding triangles
+        n = hull_next[e]
+        while _cross(points, n, hull_next[n], i) < 0:
+            q = hull_next[n]
+            t = add_triangle(n, i, q, hull_tri[i], -1, hull_tri[n])
+            hull_tri[i] = legalize(t + 2)
+            hull_next[n] = n  # Mark as removed
+            n = q
+
+        # Walk backward from the other side
+        if e == start:
+            while _cross(points, hull_prev[e], e, i) < 0:
+                q = hull_prev[e]
+                t = add_triangle(q, i, e, -1, hull_tri[e], hull_tri[q])
+                legalize(t + 2)
+                hull_tri[q] = t
+                hull_next[e] = e
+                e = q
+
+        hull_start = hull_prev[i] = e
+        hull_next[e] = hull_prev[n] = i
+        hull_next[i] = n
+        hull_hash[hash_key(i)] = i
+        hull_hash[hash_key(e)] = e
+
+    edges = set()
+    for t in range(0, len(triangles), 3):
+        for k in range(3):
+            a, b = triangles[t + k], triangles[t + (k + 1) % 3]
+            edges.add((a, b) if a < b else (b, a))
+    return sorted(edges)
+
+def _find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+def planar_edges(points, rng, max_degree=4):
+    """Return the edges of a connected planar graph on points, as (i, j) tuples.
+
+    Edges are taken from the Delaunay triangulation, shortest first. Most
+    nodes get up to 3 edges and about one in six gets up to max_degree,
+    matching the mix the old generator produced.
+    """
+    candidates = triangulate(points)
+    rng.shuffle(candidates)  # Break ties between equal lengths differently for each seed
+
+    def length(edge):
+        (ax, ay), (bx, by) = points[edge[0]], points[edge[1]]
+        return (ax - bx) ** 2 + (ay - by) ** 2
+    candidates.sort(key=length)
+
+    degree = [0] * len(points)
+    chosen = set()
+
+    def add(edge, limit):
+        a, b = edge
+        if edge in chosen or degree[a] >= limit[a] or degree[b] >= limit[b]:
+            return False
+        chosen.add(edge)
+        degree[a] += 1
+        degree[b] += 1
+        return True
+
+    # Shortest spanning tree first, so the graph is connected
+    caps = [max_degree] * len(points)
+    parents = list(range(len(points)))
+    for edge in candidates:
+        a, b = _find(parents, edge[0]), _find(parents, edge[1])
+        if a != b and add(edge, caps):
+            parents[a] = b
+
+    # Then the short edges that fit under each node's own cap
+    targets = [max_degree if rng.random() < 1 / 6 else 3 for _ in points]
+    for edge in candidates:
+        add(edge, targets)
+
+    # Finally make sure no node is left hanging on a single edge
+    lonely = {i for i, d in enumerate(degree) if d < 2}
+    for edge in candidates:
+        if lonely & set(edge):
+            add(edge, caps)
+            lonely -= {i for i in edge if degree[i] >= 2}
+    return sorted(chosen)
@@ -0,0 +1,146 @@
+import numpy as np
+
+# Puzzle graph stored as flat arrays. Positions and flags are per-node
+# arrays, every edge is stored once as an (index, index) row with the lower
+# index first, and neighbours are looked up in a CSR table (the neighbours
+# of node i are adjacency[offsets[i]:offsets[i + 1]]).
+
+class NodeView:
+    """One node of a Graph. Reads and writes go straight to the graph's arrays."""
+
+    __slots__ = ('graph', 'index')
+
+    def __init__(self, graph, index):
+        self.graph = graph
+        self.index = index
+
+    @property
+    def x(self):
+        return self.graph.xs.item(self.index)
+
+    @x.setter
+    def x(self, value):
+        self.graph.xs[self.index] = value
+
+    @property
+    def y(self):
+        return self.graph.ys.item(self.index)
+
+    @y.setter
+    def y(self, value):
+        self.graph.ys[self.index] = value
+
+    @property
+    def dragging(self):
+        return bool(self.graph.dragging[self.index])
+
+    @dragging.setter
+    def dragging(self, value):
+        self.graph.dragging[self.index] = value
+
+    @property
+    def highlighted(self):
+        return bool(self.graph.highlighted[self.index])
+
+    @highlighted.setter
+    def highlighted(self, value):
+        self.graph.highlighted[self.index] = value
+
+    @property
+    def connections(self):
+        nodes = self.graph.nodes
+        return [nodes[i] for i in self.graph.neighbours(self.index)]
+
+    def connect(self, other):
+        if self.graph.degrees[self.index] < 4 and self.graph.degrees[other.index] < 4:
+            return self.graph.connect(self.index, other.index)
+        return False
+
+class Graph:
+    """A sequence of node views backed by coordinate, edge and adjacency arrays."""
+
+    def __init__(self, xs, ys, node_type=NodeView):
+        self.xs = np.array(xs, dtype=np.float64)
+        self.ys = np.array(ys, dtype=np.float64)
+        count = len(self.xs)
+        self.dragging = np.zeros(count, dtype=bool)
+        self.highlighted = np.zeros(count, dtype=bool)
+        self.degrees = np.zeros(count, dtype=np.int64)
+        self.nodes = [node_type(self, i) for i in range(count)]
+        self._keys = {}  # Edge -> None, in the order edges were added
+        self._edges = None
+        self._offsets = None
+        self._adjacency = None
+        self._offsets_list = None
+        self._adjacency_list = None
+
+    @classmethod
+    def from_arrays(cls, xs, ys, edges, node_type=NodeView):
+        """Build a graph from positions and an (E, 2) array of node index pairs."""
+        graph = cls(xs, ys, node_type)
+        # The same as calling connect for every row, without the Python loop
+        edges = np.sort(np.asarray(edges, dtype=np.int64).reshape(-1, 2), axis=1)
+        graph._keys = dict.fromkeys(map(tuple, edges[edges[:, 0] != edges[:, 1]].tolist()))
+        if graph._keys:
+            graph.degrees = np.bincount(np.array(list(graph._keys)).ravel(), minlength=len(graph)).astype(np.int64)
+        return graph
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __getitem__(self, index):
+        return self.nodes[index]
+
+    def connect(self, first, second):
+        """Add the edge between two node indices. Returns False if it is already there."""
+        key = (first, second) if first < second else (second, first)
+        if first == second or key in self._keys:
+            return False
+        self._keys[key] = None
+        self.degrees[first] += 1
+        self.degrees[second] += 1
+        self._edges = self._offsets = self._adjacency = None
+        return True
+
+    def _build(self):
+        self._edges = np.array(list(self._keys), dtype=np.int64).reshape(-1, 2)
+        sources = np.concatenate((self._edges[:, 0], self._edges[:, 1]))
+        targets = np.concatenate((self._edges[:, 1], self._edges[:, 0]))
+        self._adjacency = targets[np.argsort(sources, kind='stable')]
+        self._offsets = np.zeros(len(self.nodes) + 1, dtype=np.int64)
+        np.cumsum(self.degrees, out=self._offsets[1:])
+        self._offsets_list = self._offsets.tolist()
+        self._adjacency_list = self._adjacency.tolist()
+
+    @property
+    def edges(self):
+        """(E, 2) array of node index pairs, each edge once with the lower index first."""
+        if self._edges is None:
+            self._build()
+        return self._edges
+
+    @property
+    def offsets(self):
+        if self._offsets is None:
+            self._build()
+        return self._offsets
+
+    @property
+    def adjacency(self):
+        if self._adjacency is None:
+            self._build()
+        return self._adjacency
+
+    def neighbours(self, index):
+        """Return the indices of the nodes connected to index, as a list."""
+        if self._adjacency is None:
+            self._build()
+        return self._adjacency_list[self._offsets_list[index]:self._offsets_list[index + 1]]
+
+    def edge_coords(self):
+        """Return an (E, 4) array with the (x1, y1, x2, y2) row of every edge."""
+        first, second = self.edges[:, 0], self.edges[:, 1]
+        return np.column_stack((self.xs[first], self.ys[first], self.xs[second], self.ys[second]))
@@ -0,0 +1,33 @@
+import functools
+
+import pygame.font
+import pygame.surface
+
+# Text for the HUD, buttons and banners. Fonts are created once per size and
+# rendered strings are kept in a bounded LRU cache, so text that does not
+# change between frames (labels, the node count, the timer within one
+# second) is not rendered again. Cached surfaces are shared, so callers must
+# only blit them.
+
+TEXT_CACHE_SIZE = 256
+
+@functools.lru_cache(maxsize=None)
+def get_font(size):
+    return pygame.font.Font(None, size)
+
+@functools.lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(text, size, color):
+    return get_font(size).render(text, True, color)
+
+@functools.lru_cache(maxsize=16)
+def render_outlined(text, size, color, outline_color, offset):
+    """Return text with an outline offset pixels wide, composed onto one surface."""
+    outline = render_text(text, size, outline_color)
+    width, height = outline.get_size()
+    surface = pygame.surface.Surface((width + 2 * offset, height + 2 * offset), pygame.SRCALPHA)
+    for dx in (-offset, 0, offset):
+        for dy in (-offset, 0, offset):
+            if dx != 0 or dy != 0:
+                surface.blit(outline, (offset + dx, offset + dy))
+    surface.blit(render_text(text, size, color), (offset, offset))
+    return surface
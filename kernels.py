@@ -0,0 +1,112 @@
+import numpy as np
+
+# Batched versions of do_lines_intersect. Edges are passed around as two
+# arrays: coords with one (x1, y1, x2, y2) row per edge and ends with the
+# (index, index) node pair of each row. Every test uses the same arithmetic
+# as do_lines_intersect, so the results are identical.
+
+BLOCK_SIZE = 1 << 21  # Segment pairs tested per batch, to bound memory use
+
+def edge_arrays(nodes):
+    """Return (coords, ends) for every edge of a Graph, each edge once."""
+    return nodes.edge_coords(), nodes.edges.copy()
+
+def _orientation(px, py, qx, qy, rx, ry):
+    return np.sign((qy - py) * (rx - qx) - (qx - px) * (ry - qy))
+
+def _on_segment(px, py, qx, qy, rx, ry):
+    """Check if point q lies on segment pr"""
+    return ((np.minimum(px, rx) <= qx) & (qx <= np.maximum(px, rx)) &
+            (np.minimum(py, ry) <= qy) & (qy <= np.maximum(py, ry)))
+
+def segments_touch(first, second):
+    """Return do_lines_intersect for every pair of rows of two broadcastable coordinate arrays."""
+    x1, y1, x2, y2 = first[..., 0], first[..., 1], first[..., 2], first[..., 3]
+    x3, y3, x4, y4 = second[..., 0], second[..., 1], second[..., 2], second[..., 3]
+
+    o1 = _orientation(x1, y1, x2, y2, x3, y3)
+    o2 = _orientation(x1, y1, x2, y2, x4, y4)
+    o3 = _orientation(x3, y3, x4, y4, x1, y1)
+    o4 = _orientation(x3, y3, x4, y4, x2, y2)
+
+    return (((o1 != o2) & (o3 != o4)) |
+            ((o1 == 0) & _on_segment(x1, y1, x3, y3, x2, y2)) |
+            ((o2 == 0) & _on_segment(x1, y1, x4, y4, x2, y2)) |
+            ((o3 == 0) & _on_segment(x3, y3, x1, y1, x4, y4)) |
+            ((o4 == 0) & _on_segment(x3, y3, x2, y2, x4, y4)))
+
+def _separate(first, second):
+    """Return True where two edges share no node."""
+    a, b = first[..., 0], first[..., 1]
+    c, d = second[..., 0], second[..., 1]
+    return (a != c) & (a != d) & (b != c) & (b != d)
+
+def _boxes_overlap(first, second):
+    """Cheap bounding-box rejection, so most pairs skip the orientation tests."""
+    return ((np.minimum(first[..., 0], first[..., 2]) <= np.maximum(second[..., 0], second[..., 2])) &
+            (np.minimum(second[..., 0], second[..., 2]) <= np.maximum(first[..., 0], first[..., 2])) &
+            (np.minimum(first[..., 1], first[..., 3]) <= np.maximum(second[..., 1], second[..., 3])) &
+            (np.minimum(second[..., 1], second[..., 3]) <= np.maximum(first[..., 1], first[..., 3])))
+
+def _crossing_block(coords, ends, start, stop):
+    """Return the (i, j) rows of the crossing pairs with start <= i < stop and i < j."""
+    rows = slice(start, stop)
+    columns = slice(start, None)
+    candidates = _boxes_overlap(coords[rows, None, :], coords[None, columns, :])
+    candidates &= np.arange(start, stop)[:, None] < np.arange(start, len(coords))[None, :]
+    candidates &= _separate(ends[rows, None, :], ends[None, columns, :])
+    i, j = np.nonzero(candidates)
+    touching = segments_touch(coords[start + i], coords[start + j])
+    return start + i[touching], start + j[touching]
+
+def _blocks(count, width=None):
+    step = max(1, BLOCK_SIZE // max(count if width is None else width, 1))
+    for start in range(0, count, step):
+        yield start, min(count, start + step)
+
+def crossing_counts(coords, ends):
+    """Return an array with the number of other edges crossing each edge."""
+    counts = np.zeros(len(coords), dtype=np.int64)
+    for start, stop in _blocks(len(coords)):
+        i, j = _crossing_block(coords, ends, start, stop)
+        counts += np.bincount(i, minlength=len(coords))
+        counts += np.bincount(j, minlength=len(coords))
+    return counts
+
+def rows_crossing(coords, ends, rows, against):
+    """Return a boolean array marking which of rows cross at least one of the against rows."""
+    mask = np.zeros(len(rows), dtype=bool)
+    second = coords[against][None, :, :]
+    second_ends = ends[against][None, :, :]
+    for start, stop in _blocks(len(rows), len(against)):
+        block = rows[start:stop]
+        candidates = _boxes_overlap(coords[block][:, None, :], second)
+        candidates &= _separate(ends[block][:, None, :], second_ends)
+        i, j = np.nonzero(candidates)
+        touching = segments_touch(coords[block[i]], coords[against[j]])
+        mask[start + i[touching]] = True
+    return mask
+
+def pairs_crossing(coords, ends, rows, against):
+    """Return (i, j) index arrays into rows and against of every pair of those rows that cross."""
+    found_i, found_j = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    second = coords[against][None, :, :]
+    second_ends = ends[against][None, :, :]
+    for start, stop in _blocks(len(rows), len(against)):
+        block = rows[start:stop]
+        candidates = _boxes_overlap(coords[block][:, None, :], second)
+        candidates &= _separate(ends[block][:, None, :], second_ends)
+        i, j = np.nonzero(candidates)
+        touching = segments_touch(coords[block[i]], coords[against[j]])
+        found_i.append(start + i[touching])
+        found_j.append(j[touching])
+    return np.concatenate(found_i), np.concatenate(found_j)
+
+def segment_crossings(coords, ends, segment, segment_ends):
+    """Return a boolean array marking the edges that cross one segment.
+
+    segment is an (x1, y1, x2, y2) row and segment_ends its node pair; edges
+    sharing a node with it never count.
+    """
+    segment = np.asarray(segment, dtype=np.float64)
+    return segments_touch(segment, coords) & _separate(np.asarray(segment_ends), ends)
@@ -1,284 +1,401 @@
-from main import *
-import random
-
-class Node:
-    def __init__(self, x, y, index):
-        self.x = x
-        self.y = y
-        self.index = index
-        self.connections = []
-        self.dragging = False
-        self.highlighted = False  # To track if a node should be highlighted
-
-    def connect(self, other):
-        if other not in self.connections and len(self.connections) < 4 and len(other.connections) < 4:
-            self.connections.append(other)
-            other.connections.append(self)
-
-    def draw(self):
-        # Draw a black outline
-        pygame.draw.circle(screen, (0, 0, 0), (self.x, self.y), NODE_RADIUS + 1)  # Outline (1 pixel larger)
-
-        # Highlight if the node is being dragged or should be highlighted
-        color = HIGHLIGHT_COLOR if self.highlighted else NODE_COLOR
-        pygame.draw.circle(screen, color, (self.x, self.y), NODE_RADIUS)  # Fill the node
-
-    def is_hovered(self, pos):
-        return math.hypot(pos[0] - self.x, pos[1] - self.y) <= NODE_RADIUS
-
-def generate_nodes():
-    nodes = []
-    grid_size = 2 * math.ceil(math.sqrt(NODE_COUNT))
-    spacing = SCREEN_WIDTH // grid_size  # Size of each grid cell
-    grid_positions = []
-
-    # Generate all possible grid positions
-    for i in range(grid_size):
-        for j in range(grid_size):
-            x = spacing // 2 + i * spacing
-            y = spacing // 2 + j * spacing
-            grid_positions.append((x, y))
-
-    # Randomly shuffle the grid positions and select positions for nodes
-    random.shuffle(grid_positions)
-    for i in range(NODE_COUNT):
-        x, y = grid_positions.pop()
-        nodes.append(Node(x, y, i))
-
-    return nodes
-
-def arrange_nodes_in_circle(nodes):
-    # Arrange nodes in a circle
-    angle_step = 2 * math.pi / NODE_COUNT
-    radius = SCREEN_HEIGHT // 3  # Dynamic radius based on screen height
-    center_x, center_y = SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2
-
-    for i, node in enumerate(nodes):
-        angle = i * angle_step
-        node.x = int(center_x + radius * math.cos(angle))
-        node.y = int(center_y + radius * math.sin(angle))
-
-def do_lines_intersect(x1, y1, x2, y2, x3, y3, x4, y4):
-    def orientation(p, q, r):
-        """Calculate the orientation of the triplet (p, q, r).
-        0 -> p, q and r are collinear
-        1 -> Clockwise
-        2 -> Counterclockwise
-        """
-        val = (q[1] - p[1]) * (r[0] - q[0]) - (q[0] - p[0]) * (r[1] - q[1])
-        if val == 0:
-            return 0
-        return 1 if val > 0 else 2
-
-    def on_segment(p, q, r):
-        """Check if point q lies on segment pr"""
-        if (min(p[0], r[0]) <= q[0] <= max(p[0], r[0]) and
-                min(p[1], r[1]) <= q[1] <= max(p[1], r[1])):
-            return True
-        return False
-
-    # Convert coordinates into points for easier handling
-    p1, q1 = (x1, y1), (x2, y2)
-    p2, q2 = (x3, y3), (x4, y4)
-
-    # Find the four orientations needed for the general and special cases
-    o1 = orientation(p1, q1, p2)
-    o2 = orientation(p1, q1, q2)
-    o3 = orientation(p2, q2, p1)
-    o4 = orientation(p2, q2, q1)
-
-    # General case: lines intersect if orientations are different
-    if o1 != o2 and o3 != o4:
-        return True
-
-    # Special cases: Check if the points are collinear and lie on the segments
-    if o1 == 0 and on_segment(p1, p2, q1):
-        return True
-    if o2 == 0 and on_segment(p1, q2, q1):
-        return True
-    if o3 == 0 and on_segment(p2, p1, q2):
-        return True
-    if o4 == 0 and on_segment(p2, q1, q2):
-        return True
-
-    # Otherwise, the lines do not intersect
-    return False
-
-def check_line_overlap(node1, node2, nodes):
-    for other in nodes:
-        if other == node1 or other == node2:
-            continue
-        for connected in other.connections:
-            if connected == node1 or connected == node2:
-                continue
-            if do_lines_intersect(
-                    node1.x, node1.y, node2.x, node2.y, other.x, other.y, connected.x, connected.y
-            ):
-                return True
-    return False
-
-def connect_nodes(nodes):
-    # Ensure all nodes are part of one chain
-    unconnected_nodes = nodes[:]
-    connected_nodes = [unconnected_nodes.pop(0)]
-
-    while unconnected_nodes:
-        current_node = connected_nodes[-1]
-
-        # Find a nearest unconnected node
-        nearest_node = min(unconnected_nodes, key=lambda n: math.hypot(n.x - current_node.x, n.y - current_node.y))
-
-        if not check_line_overlap(current_node, nearest_node, nodes):
-            current_node.connect(nearest_node)
-            connected_nodes.append(nearest_node)
-            unconnected_nodes.remove(nearest_node)
-        else:
-            # Backtrack if connection fails
-            connected_nodes.pop()
-
-    # Ensure every node has at least 2 connections
-    for node in nodes:
-        while len(node.connections) < 2:
-            connected = False  # Flag to check if a valid connection was made
-            for other in nodes:
-                if node == other or other in node.connections or len(other.connections) >= 4:
-                    continue
-
-                if not check_line_overlap(node, other, nodes):
-                    node.connect(other)
-                    connected = True
-                    break  # Exit the loop once a valid connection is made
-
-            if not connected:
-                break  # Exit if there are no valid connections left to make
-
-    # Add extra connections to some nodes, ensuring no node exceeds 4 connections
-    for node in nodes:
-        for other in nodes:
-            random_number = random.uniform(3, 15)
-            if(random_number >= 5):
-                random_number = 3
-            if node != other and len(node.connections) < random_number and len(other.connections) < random_number and other not in node.connections:
-                if not check_line_overlap(node, other, nodes):
-                    node.connect(other)
-
-def draw_nodes_and_connections(nodes, message=None, progress=None, elapsed_time=None, highlight_overlaps=False, selected_node=True):
-    screen.fill(BACKGROUND_COLOR)
-    for node in nodes:
-        for connected_node in node.connections:
-            color = LINE_COLOR
-            if selected_node == None and highlight_overlaps and check_line_overlap(node, connected_node, nodes):
-                color = (255, 0, 0)  # Red for overlapping lines
-            pygame.draw.line(screen, color, (node.x, node.y), (connected_node.x, connected_node.y), 2)
-    for node in nodes:
-        node.draw()
-
-    # Draw the message if provided
-    if message:
-        # Increase font size
-        large_font = pygame.font.Font(None, 48)  # Larger font size
-        text_surface = large_font.render(message, True, SOLVED_COLOR)  # Text with original color
-
-        # Calculate the position to center the message
-        text_rect = text_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
-
-        # Draw the black outline around the text
-        outline_color = (0, 0, 0)  # Black outline color
-        outline_offset = 2  # Adjust this for thicker or thinner outline
-
-        # Draw the outline (multiple times with offsets)
-        for dx in [-outline_offset, 0, outline_offset]:
-            for dy in [-outline_offset, 0, outline_offset]:
-                if dx != 0 or dy != 0:
-                    # Draw the outline in black around the text
-                    outline_surface = large_font.render(message, True, outline_color)
-                    screen.blit(outline_surface, (text_rect.x + dx, text_rect.y + dy))
-
-        # Draw the main text (in SOLVED_COLOR)
-        screen.blit(text_surface, text_rect)
-
-    # Display the number of nodes and elapsed time
-    font_small = pygame.font.Font(None, 24)
-    node_count_text = font_small.render(f"{NODE_COUNT} Nodes", True, (0, 0, 0))
-    screen.blit(node_count_text, (20, 50))
-
-    # Inside the main game loop where you're calculating elapsed time:
-    if elapsed_time is not None:
-        # Calculate hours, minutes, and seconds
-        hours = int(elapsed_time // 3600)  # Total hours
-        minutes = int((elapsed_time % 3600) // 60)  # Remaining minutes after hours
-        seconds = int(elapsed_time % 60)  # Remaining seconds after minutes
-
-        # Format the time as per the requirement:
-        if hours > 0:
-            time_text = font_small.render(f"{hours}h {minutes}m {seconds}s", True, (0, 0, 0))
-        elif minutes > 0:
-            time_text = font_small.render(f"{minutes}m {seconds}s", True, (0, 0, 0))
-        else:
-            time_text = font_small.render(f"{seconds}s", True, (0, 0, 0))
-
-        # Draw the time on the screen
-        screen.blit(time_text, (20, 70))
-
-    # Simplified Progress Bar (Smooth Animation + Outline)
-    if progress is not None:
-        progress_width = SCREEN_WIDTH // 16
-        progress_height = 20
-        progress_rect = pygame.Rect(20, 20, progress_width, progress_height)
-
-        # Draw the background of the progress bar
-        pygame.draw.rect(screen, PROGRESS_BG_COLOR, progress_rect)
-
-        # Initialize a variable to store the current width of the progress bar
-        if not hasattr(pygame, 'current_progress_width'):
-            pygame.current_progress_width = 0  # Initialize on the first run
-
-        # Calculate the target width of the progress bar
-        target_width = int(progress * progress_width)
-
-        # Smoothly update the current width towards the target width
-        if pygame.current_progress_width < target_width:
-            pygame.current_progress_width += 1  # Increment smoothly
-        elif pygame.current_progress_width > target_width:
-            pygame.current_progress_width -= 1  # Decrement smoothly
-
-        # Draw the progress bar with the current width
-        progress_bar_rect = pygame.Rect(20, 20, pygame.current_progress_width, progress_height)
-        pygame.draw.rect(screen, PROGRESS_COLOR, progress_bar_rect)
-
-        # Draw the outline of the progress bar (black)
-        pygame.draw.rect(screen, (0, 0, 0), progress_rect, 2)  # Black outline with 2px thickness
-
-def is_solved(nodes):
-    for node in nodes:
-        for connected_node in node.connections:
-            if check_line_overlap(node, connected_node, nodes):
-                return False
-    return True
-
-def count_overlaps(nodes):
-    overlaps = 0
-    for node1 in nodes:
-        for node2 in node1.connections:
-            if node1.index < node2.index:  # To avoid counting the same pair twice
-                if check_line_overlap(node1, node2, nodes):
-                    overlaps += 1
-    return overlaps
-
-def print_node_connection_counts(nodes):
-    connection_counts = {}
-    for node in nodes:
-        count = len(node.connections)
-        if count not in connection_counts:
-            connection_counts[count] = 0
-        connection_counts[count] += 1
-
-    # Print the results
-    print("Node Connection Counts:")
-    for connection_count, node_count in sorted(connection_counts.items()):
-        print(f"{node_count} nodes with {connection_count} connections")
-
-def set_node_count(count):
-    global NODE_COUNT, NODE_RADIUS
-    NODE_COUNT = count
-    NODE_RADIUS = 30 / math.log(NODE_COUNT + 1)
\ No newline at end of file
+import math
+import pygame.display
+import pygame.draw
+import pygame.surface
+import pygame.surfarray
+import numpy as np
+
+import core
+from camera import Camera
+from core import *
+from hud import render_text, render_outlined
+
+# The pygame frontend: display setup and everything that draws. Nothing
+# touches SDL until init_display() is called, so importing this module does
+# not open a window.
+
+NODE_COUNT = 10  # Default number of nodes in the game
+NODE_RADIUS = node_radius(NODE_COUNT)
+
+LINE_COLOR = (0, 0, 0)
+NODE_COLOR = (0, 0, 255)
+BACKGROUND_COLOR = (230, 230, 230)
+HIGHLIGHT_COLOR = (255, 0, 0)
+SOLVED_COLOR = (0, 255, 0)
+PROGRESS_COLOR = (0, 255, 0)
+PROGRESS_BG_COLOR = (170, 170, 170)
+BUTTON_COLOR = (200, 200, 200)
+BUTTON_HOVER_COLOR = (150, 150, 150)
+TEXT_COLOR = (0, 0, 0)
+
+# Below this on-screen node radius the scene is drawn at low detail: nodes
+# are plain squares with no outline, edges are 1 pixel wide and edges up to
+# BATCH_LENGTH pixels long are plotted together with numpy
+LOD_RADIUS = 4
+BATCH_LENGTH = 32
+
+screen = None
+camera = None
+SCREEN_WIDTH, SCREEN_HEIGHT = 0, 0
+
+def init_display(size=None):
+    """Open the fullscreen window the first time it is needed and return it.
+
+    With a (width, height) size the window is that size instead, as when
+    replaying a session recorded on another screen.
+    """
+    global screen, camera, SCREEN_WIDTH, SCREEN_HEIGHT
+    if screen is None:
+        pygame.init()
+
+        if size is None:
+            # Get the screen dimensions
+            info = pygame.display.Info()
+            SCREEN_WIDTH, SCREEN_HEIGHT = info.current_w, info.current_h  # Screen resolution
+
+            # Set fullscreen mode
+            screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.FULLSCREEN)
+        else:
+            SCREEN_WIDTH, SCREEN_HEIGHT = size
+            screen = pygame.display.set_mode(size)
+        pygame.display.set_caption("Untangle")
+        camera = Camera(SCREEN_WIDTH, SCREEN_HEIGHT)
+    return screen
+
+def set_node_count(count):
+    global NODE_COUNT, NODE_RADIUS
+    NODE_COUNT = count
+    NODE_RADIUS = node_radius(NODE_COUNT)
+
+class Node(core.Node):
+    __slots__ = ()
+
+    def draw(self, surface=None):
+        surface = screen if surface is None else surface
+        x, y = camera.to_screen(self.x, self.y)
+        radius = NODE_RADIUS * camera.zoom
+
+        # Highlight if the node is being dragged or should be highlighted
+        color = HIGHLIGHT_COLOR if self.highlighted else NODE_COLOR
+        if radius < LOD_RADIUS:
+            left, top, side = _node_squares(x, y, radius)
+            return pygame.draw.rect(surface, color, (int(left), int(top), side, side))
+
+        # Draw a black outline
+        rect = pygame.draw.circle(surface, (0, 0, 0), (x, y), radius + 1)  # Outline (1 pixel larger)
+        pygame.draw.circle(surface, color, (x, y), radius)  # Fill the node
+        return rect
+
+def _low_detail():
+    return NODE_RADIUS * camera.zoom < LOD_RADIUS
+
+def _node_squares(xs, ys, radius):
+    """Return the left and top of the squares low detail nodes at xs, ys are drawn as, and their side."""
+    side = max(1, round(2 * radius))
+    return np.rint(xs - side / 2).astype(np.int64), np.rint(ys - side / 2).astype(np.int64), side
+
+def _plot(surface, xs, ys, color):
+    """Set the pixels at the integer positions xs, ys to color, skipping any off the surface."""
+    width, height = surface.get_size()
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    pixels = pygame.surfarray.pixels2d(surface)
+    pixels[xs[inside], ys[inside]] = surface.map_rgb(color)
+    del pixels  # Unlocks the surface
+
+def _plot_segments(surface, coords, color):
+    """Draw 1 pixel lines for the (x1, y1, x2, y2) rows of coords, all at once."""
+    steps = np.maximum(np.abs(coords[:, 2] - coords[:, 0]), np.abs(coords[:, 3] - coords[:, 1])).astype(np.int64) + 1
+    rows = np.repeat(np.arange(len(coords)), steps)
+    starts = np.cumsum(steps) - steps
+    t = (np.arange(len(rows)) - starts[rows]) / np.maximum(steps - 1, 1)[rows]
+    x1, y1, x2, y2 = coords[rows].T
+    _plot(surface, np.rint(x1 + (x2 - x1) * t).astype(np.int64), np.rint(y1 + (y2 - y1) * t).astype(np.int64), color)
+
+def _screen_segments(coords):
+    """Map (x1, y1, x2, y2) rows in puzzle coordinates to the screen."""
+    x1, y1 = camera.to_screen(coords[:, 0], coords[:, 1])
+    x2, y2 = camera.to_screen(coords[:, 2], coords[:, 3])
+    return np.column_stack((x1, y1, x2, y2))
+
+def _draw_edges(surface, coords, red):
+    """Draw the (x1, y1, x2, y2) screen rows of coords, in red where red is set."""
+    width = 2
+    if _low_detail():
+        width = 1
+        short = np.maximum(np.abs(coords[:, 2] - coords[:, 0]), np.abs(coords[:, 3] - coords[:, 1])) <= BATCH_LENGTH
+        _plot_segments(surface, coords[short & ~red], LINE_COLOR)
+        _plot_segments(surface, coords[short & red], (255, 0, 0))
+        coords, red = coords[~short], red[~short]
+    for (x1, y1, x2, y2), crossing in zip(coords.tolist(), red.tolist()):
+        pygame.draw.line(surface, (255, 0, 0) if crossing else LINE_COLOR, (x1, y1), (x2, y2), width)
+
+def _draw_line(surface, color, start, end):
+    """Draw one edge between screen points exactly as _draw_edges would and return the rect it covers."""
+    if not _low_detail():
+        return pygame.draw.line(surface, color, start, end, 2)
+    if max(abs(end[0] - start[0]), abs(end[1] - start[1])) > BATCH_LENGTH:
+        return pygame.draw.line(surface, color, start, end, 1)
+    _plot_segments(surface, np.array([(*start, *end)], dtype=np.float64), color)
+    left, top = math.floor(min(start[0], end[0])), math.floor(min(start[1], end[1]))
+    rect = pygame.Rect(left, top, math.ceil(max(start[0], end[0])) - left + 1, math.ceil(max(start[1], end[1])) - top + 1)
+    return rect.clip(surface.get_rect())
+
+def _red_edges(nodes, highlight_overlaps, crossing_index):
+    """Return, per edge row of the graph, whether the edge is drawn as crossing."""
+    if highlight_overlaps and crossing_index:
+        return crossing_index.crossing_mask()  # The index numbers edges in the same order as the graph
+    return np.zeros(len(nodes.edges), dtype=bool)
+
+def _draw_nodes(surface, nodes, indices):
+    """Draw the nodes in the index array indices that are on the surface."""
+    radius = NODE_RADIUS * camera.zoom
+    width, height = surface.get_size()
+    xs, ys = camera.to_screen(nodes.xs[indices], nodes.ys[indices])
+    reach = radius + 1
+    inside = (xs >= -reach) & (xs <= width + reach) & (ys >= -reach) & (ys <= height + reach)
+    indices, xs, ys = indices[inside], xs[inside], ys[inside]
+    if radius >= LOD_RADIUS:
+        for index in indices.tolist():
+            nodes[index].draw(surface)
+        return
+    lefts, tops, side = _node_squares(xs, ys, radius)
+    dx, dy = (offsets.ravel() for offsets in np.meshgrid(np.arange(side), np.arange(side)))
+    highlighted = nodes.highlighted[indices]
+    for pick, color in ((~highlighted, NODE_COLOR), (highlighted, HIGHLIGHT_COLOR)):
+        _plot(surface, (lefts[pick, None] + dx).ravel(), (tops[pick, None] + dy).ravel(), color)
+
+def _nodes_near(nodes, segments, reach):
+    """Return the indices of the nodes within reach of any of the (x1, y1, x2, y2) segments."""
+    near = np.zeros(len(nodes), dtype=bool)
+    for start in range(0, len(segments), 64):
+        block = np.array(segments[start:start + 64], dtype=np.float64)
+        x1, y1, x2, y2 = (block[:, k, None] for k in range(4))
+        dx, dy = x2 - x1, y2 - y1
+        length = dx * dx + dy * dy
+        t = np.clip(((nodes.xs - x1) * dx + (nodes.ys - y1) * dy) / np.where(length == 0, 1, length), 0, 1)
+        px, py = x1 + t * dx - nodes.xs, y1 + t * dy - nodes.ys
+        near |= (px * px + py * py <= reach * reach).any(axis=0)
+    return np.flatnonzero(near).tolist()
+
+class SceneLayer:
+    """Edges and nodes cached on a surface, with only the dragged part redrawn each frame.
+
+    The cached surface holds every edge and node except the dragged nodes,
+    their edges and the highlighted nodes. Each frame the rects drawn over
+    on the last frame are restored from it and the moving part is drawn on
+    top, so a frame costs about the size of the drag neighbourhood. The cache
+    is rebuilt when a drag starts or ends, on a new graph, when Peek Knots
+    is toggled and when the camera moves, and only what is on screen is
+    drawn into it.
+    """
+
+    def __init__(self):
+        self.surface = None
+        self.key = None  # What the cached surface was drawn for
+        self.red = None  # Per edge row, whether it was drawn as crossing
+        self.moving = None  # Per edge row, whether it was left out of the cache
+        self.rows = {}  # Edge -> row, when drawn with a crossing index
+        self.flipped = set()  # Rows that may have started or stopped crossing since the cache was drawn
+        self.previous = []  # Rects drawn over on the last frame
+
+    def invalidate(self):
+        self.key = None
+
+    def _rebuild(self, nodes, active, highlight_overlaps, crossing_index):
+        if self.surface is None or self.surface.get_size() != screen.get_size():
+            self.surface = pygame.surface.Surface(screen.get_size())
+        self.surface.fill(BACKGROUND_COLOR)
+        self.moving = nodes.dragging[nodes.edges].any(axis=1)
+        self.red = _red_edges(nodes, highlight_overlaps, crossing_index)
+        self.rows = {}
+        self.flipped = set()
+        if crossing_index:
+            self.rows = crossing_index.rows
+            crossing_index.changed.clear()
+        # Only what is on screen is drawn
+        coords = _screen_segments(nodes.edge_coords())
+        shown = ~self.moving & camera.visible_segments(coords, 2)
+        _draw_edges(self.surface, coords[shown], self.red[shown])
+        cached = np.ones(len(nodes), dtype=bool)
+        cached[list(active)] = False
+        _draw_nodes(self.surface, nodes, np.flatnonzero(cached))
+
+    def draw(self, nodes, highlight_overlaps=False, crossing_index=None):
+        """Bring the screen up to date and return the rects that changed."""
+        dragging = set(np.flatnonzero(nodes.dragging).tolist())
+        active = dragging | set(np.flatnonzero(nodes.highlighted).tolist())
+        key = (nodes, frozenset(active), highlight_overlaps, crossing_index, NODE_RADIUS, camera.key)
+        if key != self.key:
+            self._rebuild(nodes, active, highlight_overlaps, crossing_index)
+            self.key = key
+            screen.blit(self.surface, (0, 0))
+            self.previous = []
+            dirty = [screen.get_rect()]
+        else:
+            for rect in self.previous:
+                screen.blit(self.surface, rect, rect)
+            dirty = []
+
+        # Edges of the dragged nodes, and cached edges that have started or
+        # stopped crossing since the cache was drawn
+        lines = {}
+        for index in dragging:
+            for other in nodes.neighbours(index):
+                edge = (index, other) if index < other else (other, index)
+                lines[edge] = bool(highlight_overlaps and crossing_index and
+                                   crossing_index.is_crossing(nodes[index], nodes[other]))
+        if highlight_overlaps and crossing_index:
+            self.flipped |= crossing_index.changed
+            crossing_index.changed.clear()
+            for row in self.flipped:
+                lines.setdefault(crossing_index.keys[row], bool(crossing_index.counts[row] > 0))
+        # Lines already drawn in the same colour on the cached surface are left alone
+        rows = np.array([self.rows.get(edge, -1) for edge in lines], dtype=np.int64)
+        colours = np.fromiter(lines.values(), dtype=bool, count=len(lines))
+        cached = (rows >= 0) & ~self.moving[rows] & (self.red[rows] == colours)
+        lines = {edge: red for (edge, red), skip in zip(lines.items(), cached.tolist()) if not skip}
+
+        drawn = []
+        segments = []
+        for (a, b), red in lines.items():
+            segment = (nodes[a].x, nodes[a].y, nodes[b].x, nodes[b].y)
+            drawn.append(_draw_line(screen, (255, 0, 0) if red else LINE_COLOR, camera.to_screen(*segment[:2]),
+                                    camera.to_screen(*segment[2:])))
+            segments.append(segment)
+
+        # Nodes go over lines, so cached nodes under the new lines are drawn
+        # again. Where nodes overlap each other the redrawn ones end up on top.
+        redraw = set(active) | set(_nodes_near(nodes, segments, NODE_RADIUS + 3 / camera.zoom))
+        for index in sorted(redraw):
+            drawn.append(nodes[index].draw())
+
+        return dirty + drawn
+
+    def present(self, dirty):
+        """Push the rects drawn this frame, and those drawn over on the last one, to the display."""
+        pygame.display.update(self.previous + dirty)
+        self.previous = dirty
+
+def draw_nodes_and_connections(nodes, message=None, progress=None, elapsed_time=None, highlight_overlaps=False, crossing_index=None, layer=None, seed=None):
+    if layer is not None:
+        dirty = layer.draw(nodes, highlight_overlaps, crossing_index)
+    else:
+        screen.fill(BACKGROUND_COLOR)
+        red = _red_edges(nodes, highlight_overlaps, crossing_index)  # Red for overlapping lines
+        coords = _screen_segments(nodes.edge_coords())
+        shown = camera.visible_segments(coords, 2)
+        _draw_edges(screen, coords[shown], red[shown])
+        _draw_nodes(screen, nodes, np.arange(len(nodes)))
+        dirty = [screen.get_rect()]
+
+    # Draw the message if provided
+    if message:
+        # Larger text with a black outline, composed once and then cached
+        outline_offset = 2  # Adjust this for thicker or thinner outline
+        banner = render_outlined(message, 48, SOLVED_COLOR, (0, 0, 0), outline_offset)
+
+        # Calculate the position to center the message
+        banner_rect = banner.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
+        dirty.append(screen.blit(banner, banner_rect))
+
+    # Display the number of nodes, the seed to start the puzzle again with
+    # (--seed) and elapsed time
+    seed_text = "" if seed is None else f", seed {seed}"
+    node_count_text = render_text(f"{NODE_COUNT} Nodes{seed_text}", 24, (0, 0, 0))
+    dirty.append(screen.blit(node_count_text, (20, 50)))
+
+    # Inside the main game loop where you're calculating elapsed time:
+    if elapsed_time is not None:
+        # Calculate hours, minutes, and seconds
+        hours = int(elapsed_time // 3600)  # Total hours
+        minutes = int((elapsed_time % 3600) // 60)  # Remaining minutes after hours
+        seconds = int(elapsed_time % 60)  # Remaining seconds after minutes
+
+        # Format the time as per the requirement. The text only changes once
+        # a second, so the cache renders it once a second
+        if hours > 0:
+            time_text = render_text(f"{hours}h {minutes}m {seconds}s", 24, (0, 0, 0))
+        elif minutes > 0:
+            time_text = render_text(f"{minutes}m {seconds}s", 24, (0, 0, 0))
+        else:
+            time_text = render_text(f"{seconds}s", 24, (0, 0, 0))
+
+        # Draw the time on the screen
+        dirty.append(screen.blit(time_text, (20, 70)))
+
+    # Simplified Progress Bar (Smooth Animation + Outline)
+    if progress is not None:
+        progress_width = SCREEN_WIDTH // 16
+        progress_height = 20
+        progress_rect = pygame.Rect(20, 20, progress_width, progress_height)
+
+        # Draw the background of the progress bar
+        dirty.append(pygame.draw.rect(screen, PROGRESS_BG_COLOR, progress_rect))
+
+        # Initialize a variable to store the current width of the progress bar
+        if not hasattr(pygame, 'current_progress_width'):
+            pygame.current_progress_width = 0  # Initialize on the first run
+
+        # Calculate the target width of the progress bar
+        target_width = int(progress * progress_width)
+
+        # Smoothly update the current width towards the target width
+        if pygame.current_progress_width < target_width:
+            pygame.current_progress_width += 1  # Increment smoothly
+        elif pygame.current_progress_width > target_width:
+            pygame.current_progress_width -= 1  # Decrement smoothly
+
+        # Draw the progress bar with the current width
+        progress_bar_rect = pygame.Rect(20, 20, pygame.current_progress_width, progress_height)
+        dirty.append(pygame.draw.rect(screen, PROGRESS_COLOR, progress_bar_rect))
+
+        # Draw the outline of the progress bar (black)
+        dirty.append(pygame.draw.rect(screen, (0, 0, 0), progress_rect, 2))  # Black outline with 2px thickness
+
+    return dirty
+
+def progress_animating(progress):
+    """Return True while the progress bar is still sliding towards progress."""
+    current = getattr(pygame, 'current_progress_width', 0)
+    return progress is not None and current != int(progress * (SCREEN_WIDTH // 16))
+
+def draw_button(text, rect, is_hovered):
+    """Draws a button with the given text and rectangle."""
+    color = BUTTON_HOVER_COLOR if is_hovered else BUTTON_COLOR
+    pygame.draw.rect(screen, color, rect)
+    pygame.draw.rect(screen, LINE_COLOR, rect, 2)
+    text_surface = render_text(text, 24, TEXT_COLOR)
+    text_rect = text_surface.get_rect(center=rect.center)
+    return rect.union(screen.blit(text_surface, text_rect))
+
+def draw_profile_overlay(summary, bottomleft):
+    """Draws the frame-time overlay from FrameProfiler.summary() above bottomleft and returns its rect."""
+    if summary is None:
+        lines = ["Profiling..."]
+    else:
+        lines = [f"{summary['fps']:.0f} FPS  frame p50 {summary['p50'] * 1000:.1f} ms  p99 {summary['p99'] * 1000:.1f} ms",
+                 f"Worst stage: {summary['worst_stage']} {summary['worst_time'] * 1000:.1f} ms",
+                 f"Per frame: {summary['do_lines_intersect']:.0f} line tests, {summary['kernel_pair_tests']:.0f} pair tests"]
+    surfaces = [render_text(line, 20, TEXT_COLOR) for line in lines]
+    rect = pygame.Rect(0, 0, max(s.get_width() for s in surfaces) + 10, sum(s.get_height() for s in surfaces) + 10)
+    rect.bottomleft = bottomleft
+    pygame.draw.rect(screen, BUTTON_COLOR, rect)
+    y = rect.top + 5
+    for surface in surfaces:
+        screen.blit(surface, (rect.left + 5, y))
+        y += surface.get_height()
+    return rect
+
+def draw_selection_box(corner, other_corner):
+    """Draws the outline of the box being dragged out to select nodes."""
+    rect = pygame.Rect(min(corner[0], other_corner[0]), min(corner[1], other_corner[1]),
+                       abs(corner[0] - other_corner[0]) + 1, abs(corner[1] - other_corner[1]) + 1)
+    return pygame.draw.rect(screen, HIGHLIGHT_COLOR, rect, 1)
+
+def draw_input_box(input_text, rect, is_active):
+    """Draws an input box."""
+    color = LINE_COLOR if is_active else BUTTON_COLOR
+    pygame.draw.rect(screen, color, rect, 2)
+    text_surface = render_text(input_text, 24, TEXT_COLOR)
+    text_rect = text_surface.get_rect(midleft=(rect.left + 5, rect.centery))
+    return rect.union(screen.blit(text_surface, text_rect))
@@ -1,300 +1,596 @@
-import pygame.display
-import pygame.font
-import pygame.event
-import pygame.mouse
-import pygame.time
-import pygame.draw
-import math
-import json
-from cryptography.fernet import Fernet
-from logic import *
-
-# Constants
-global NODE_COUNT
-
-NODE_COUNT = 10  # Default number of nodes in the game
-
-NODE_RADIUS = 30 / math.log(NODE_COUNT + 1)
-LINE_COLOR = (0, 0, 0)
-NODE_COLOR = (0, 0, 255)
-BACKGROUND_COLOR = (230, 230, 230)
-HIGHLIGHT_COLOR = (255, 0, 0)
-SOLVED_COLOR = (0, 255, 0)
-PROGRESS_COLOR = (0, 255, 0)
-PROGRESS_BG_COLOR = (170, 170, 170)
-BUTTON_COLOR = (200, 200, 200)
-BUTTON_HOVER_COLOR = (150, 150, 150)
-TEXT_COLOR = (0, 0, 0)
-
-# Initialize pygame
-pygame.init()
-
-# Get the screen dimensions
-info = pygame.display.Info()
-SCREEN_WIDTH, SCREEN_HEIGHT = info.current_w, info.current_h  # Screen resolution
-
-# Set fullscreen mode
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.FULLSCREEN)
-
-pygame.display.set_caption("Untangle")
-font = pygame.font.Font(None, 24)
-
-def draw_button(text, rect, is_hovered):
-    """Draws a button with the given text and rectangle."""
-    color = BUTTON_HOVER_COLOR if is_hovered else BUTTON_COLOR
-    pygame.draw.rect(screen, color, rect)
-    pygame.draw.rect(screen, LINE_COLOR, rect, 2)
-    text_surface = font.render(text, True, TEXT_COLOR)
-    text_rect = text_surface.get_rect(center=rect.center)
-    screen.blit(text_surface, text_rect)
-
-def draw_input_box(input_text, rect, is_active):
-    """Draws an input box."""
-    color = LINE_COLOR if is_active else BUTTON_COLOR
-    pygame.draw.rect(screen, color, rect, 2)
-    text_surface = font.render(input_text, True, TEXT_COLOR)
-    text_rect = text_surface.get_rect(midleft=(rect.left + 5, rect.centery))
-    screen.blit(text_surface, text_rect)
-
-def load_key():
-    return b'NwD-pjylTOlkX5JCIylTXI7t1lazuzHnsxjjgbsgN84='
-
-# Encrypt the data before saving it
-def encrypt_data(data):
-    key = load_key()
-    fernet = Fernet(key)
-    encrypted_data = fernet.encrypt(data.encode())
-    return encrypted_data
-
-# Decrypt the data after loading it
-def decrypt_data(encrypted_data):
-    key = load_key()
-    fernet = Fernet(key)
-    decrypted_data = fernet.decrypt(encrypted_data).decode()
-    return decrypted_data
-
-def save_game(filename, start_time, puzzle_solved, solved_time, remaining_overlaps, nodes, initial_overlaps):
-    save_data = {
-        'nodes': [],
-        'elapsed_time': pygame.time.get_ticks() - start_time if start_time else 0,
-        'puzzle_solved': puzzle_solved,
-        'solved_time': solved_time,
-        'remaining_overlaps': remaining_overlaps,
-        'initial_overlaps': initial_overlaps  # Add initial_overlaps to the saved data
-    }
-
-    for node in nodes:
-        node_data = {
-            'x': node.x,
-            'y': node.y,
-            'index': node.index,
-            'connections': [conn.index for conn in node.connections],
-            'dragging': node.dragging,
-            'highlighted': node.highlighted
-        }
-        save_data['nodes'].append(node_data)
-
-    json_data = json.dumps(save_data)
-    encrypted_data = encrypt_data(json_data)
-
-    with open(filename, 'wb') as f:
-        f.write(encrypted_data)
-
-def load_game(filename):
-    with open(filename, 'rb') as f:
-        encrypted_data = f.read()
-
-    # Decrypt the data
-    decrypted_data = decrypt_data(encrypted_data)
-
-    # Convert decrypted data back to a Python dictionary
-    save_data = json.loads(decrypted_data)
-
-    NODE_COUNT = len(save_data['nodes'])
-    NODE_RADIUS = 30 / math.log(NODE_COUNT + 1)
-    nodes = []
-
-    for node_data in save_data['nodes']:
-        node = Node(node_data['x'], node_data['y'], node_data['index'])
-        node.dragging = node_data['dragging']
-        node.highlighted = node_data['highlighted']
-        nodes.append(node)
-
-    for i, node_data in enumerate(save_data['nodes']):
-        nodes[i].connections = [nodes[idx] for idx in node_data['connections']]
-
-    initial_overlaps = save_data['initial_overlaps']
-    start_time = pygame.time.get_ticks() - save_data['elapsed_time']
-    solved_time = save_data['solved_time']
-    puzzle_solved = save_data['puzzle_solved']
-    remaining_overlaps = save_data['remaining_overlaps']
-
-    return nodes, initial_overlaps, start_time, solved_time, puzzle_solved, remaining_overlaps, NODE_RADIUS
-
-def main():
-    global NODE_COUNT, NODE_RADIUS
-
-    def reset_game():
-        """Resets the game with the current NODE_COUNT."""
-        nonlocal nodes, initial_overlaps, start_time, solved_time, puzzle_solved, remaining_overlaps
-        NODE_RADIUS = 30 / math.log(NODE_COUNT + 1)
-        nodes = generate_nodes()  # Pass NODE_COUNT to generate_nodes explicitly
-        connect_nodes(nodes)
-        arrange_nodes_in_circle(nodes)
-        initial_overlaps = count_overlaps(nodes)
-        start_time = pygame.time.get_ticks()
-        solved_time = None
-        puzzle_solved = False
-        remaining_overlaps = count_overlaps(nodes)
-
-    def save_game_button():
-        save_game("UntangleSave.knot", start_time, puzzle_solved, solved_time, remaining_overlaps, nodes, initial_overlaps)
-
-    def load_game_button():
-        try:
-            a = load_game("UntangleSave.knot")
-            return a
-        except FileNotFoundError:
-            print("Save file not found.")
-
-    try:
-        nodes = generate_nodes()
-        connect_nodes(nodes)
-        arrange_nodes_in_circle(nodes)
-    except RuntimeError as e:
-        print(e)
-        return
-
-    initial_overlaps = count_overlaps(nodes)
-    selected_node = None
-    running = True
-    start_time = pygame.time.get_ticks()
-    solved_time = None
-    puzzle_solved = False
-
-    button_rect = pygame.Rect(SCREEN_WIDTH - 150, 10, 140, 30)
-    input_box_rect = pygame.Rect(SCREEN_WIDTH - 150, 50, 140, 30)
-    highlight_button_rect = pygame.Rect(SCREEN_WIDTH - 150, 90, 140, 30)
-    load_button_rect = pygame.Rect(SCREEN_WIDTH - 150, SCREEN_HEIGHT - 40, 140, 30)  # Bottom-right corner
-    save_button_rect = pygame.Rect(SCREEN_WIDTH - 150, SCREEN_HEIGHT - 80, 140, 30)  # Above the Load button
-    input_text = ""
-    input_active = False
-
-    highlight_overlaps = False  # Track if overlaps should be highlighted
-    remaining_overlaps = count_overlaps(nodes)
-
-    while running:
-        if puzzle_solved:
-            elapsed_time = solved_time
-        else:
-            elapsed_time = (pygame.time.get_ticks() - start_time) / 1000
-
-        if selected_node == None:
-            remaining_overlaps = count_overlaps(nodes)
-        if initial_overlaps != 0:
-            progress = 1 - (remaining_overlaps / initial_overlaps)
-        else:
-            progress = 0
-
-        message = None
-        mouse_pos = pygame.mouse.get_pos()
-        button_hovered = button_rect.collidepoint(mouse_pos)
-        highlight_button_hovered = highlight_button_rect.collidepoint(mouse_pos)
-        save_button_hovered = save_button_rect.collidepoint(mouse_pos)
-        load_button_hovered = load_button_rect.collidepoint(mouse_pos)
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 1:
-                    if button_hovered:
-                        if input_text.isdigit() and int(input_text) > 0:
-                            set_node_count(int(input_text))
-                            reset_game()
-                            input_text = ""
-                        else:
-                            reset_game()
-                            input_text = ""
-                    elif highlight_button_hovered:
-                        highlight_overlaps = not highlight_overlaps
-                    elif save_button_hovered:
-                        save_game_button()  # Call save game function
-                    elif load_button_hovered:
-                        try:
-                            a = load_game_button()  # Call load game function
-                            nodes = a[0]
-                            initial_overlaps = a[1]
-                            start_time = a[2]
-                            solved_time = a[3]
-                            puzzle_solved = a[4]
-                            remaining_overlaps = a[5]
-                            NODE_RADIUS = a[6]
-                            set_node_count(len(nodes))
-                        except:
-                            pass
-                    elif input_box_rect.collidepoint(mouse_pos):
-                        input_active = True
-                    else:
-                        input_active = False
-
-                    for node in nodes:
-                        if node.is_hovered(event.pos):
-                            node.dragging = True
-                            selected_node = node
-                            for connected_node in node.connections:
-                                connected_node.highlighted = True
-                            selected_node.highlighted = True
-                            break
-
-            elif event.type == pygame.MOUSEBUTTONUP:
-                if event.button == 1:
-                    if selected_node:
-                        selected_node.dragging = False
-                        for connected_node in selected_node.connections:
-                            connected_node.highlighted = False
-                        selected_node.highlighted = False
-                        selected_node = None
-
-            elif event.type == pygame.MOUSEMOTION:
-                if selected_node:
-                    selected_node.x, selected_node.y = event.pos
-
-            elif event.type == pygame.KEYDOWN:
-                if input_active:
-                    if event.key == pygame.K_BACKSPACE:
-                        input_text = input_text[:-1]
-                    elif event.key == pygame.K_RETURN:
-                        input_active = False
-                    else:
-                        input_text += event.unicode
-
-        if remaining_overlaps == 0 and not puzzle_solved:
-            puzzle_solved = True
-            solved_time = elapsed_time
-
-        if remaining_overlaps == 0:
-            message = "Puzzle Solved!"
-
-        screen.fill(BACKGROUND_COLOR)
-        draw_nodes_and_connections(nodes, message, progress, elapsed_time, highlight_overlaps, selected_node)
-        draw_button("New Game", button_rect, button_hovered)
-        draw_button("Peek Knots", highlight_button_rect, highlight_button_hovered)
-        draw_button("Save Game", save_button_rect, save_button_hovered)  # Save button
-        draw_button("Load Game", load_button_rect, load_button_hovered)  # Load button
-        draw_input_box(input_text, input_box_rect, input_active)
-
-        footer_text = font.render("Made by Oliver", True, (200, 200, 200))
-        footer_rect = footer_text.get_rect()
-        footer_rect.bottomleft = (10, SCREEN_HEIGHT - 10)
-        screen.blit(footer_text, footer_rect)
-
-        pygame.display.flip()
-
-    pygame.quit()
-
-
-
-if __name__ == "__main__":
-    main()
+import pygame.display
+import pygame.font
+import pygame.event
+import pygame.mouse
+import pygame.time
+import pygame.draw
+import argparse
+import random
+import time
+import numpy as np
+import logic
+from logic import *
+from camera import ZOOM_STEP
+from crossings import CrossingIndex, crossing_counts
+from frames import DEFAULT_FPS
+from packs import PuzzlePack
+from profiler import FrameProfiler, write_trace
+from puzzlecache import PuzzleCache, default_directory
+from replay import InputRecorder, LiveInput
+from savefile import Session, append_journal, read_save, write_snapshot
+from saveio import IO_DONE, IOWorker
+from solver import Animation, hint, solve_layout
+from hud import render_text
+
+SAVE_FILE = "UntangleSave.knot"
+AUTOSAVE_INTERVAL = 10000  # Milliseconds between autosaves while nodes are being moved
+SOLVE_TIME = 1500  # Milliseconds the Solve animation takes
+HINT_TIME = 400  # Milliseconds a hinted node takes to move
+STATUS_TIME = 3000  # Milliseconds a save or load message stays up
+PROFILE_KEY = pygame.K_F3  # Shows the frame-time overlay and starts recording
+TRACE_KEY = pygame.K_F4  # Writes the recorded frames to a trace file
+RESET_VIEW_KEY = pygame.K_HOME  # Zooms back out to the whole play area
+CLEAR_SELECTION_KEY = pygame.K_ESCAPE  # Drops the nodes picked with a selection box
+
+PUZZLE_READY = pygame.event.custom_type()  # Posted when a background puzzle is done, to wake the loop
+
+def load_key():
+    return b'NwD-pjylTOlkX5JCIylTXI7t1lazuzHnsxjjgbsgN84='
+
+def make_session(now, start_time, puzzle_solved, solved_time, remaining_overlaps, nodes, initial_overlaps):
+    """Return a Session with copies of the node arrays, safe to hand to the I/O thread."""
+    elapsed = now - start_time if start_time else 0
+    return Session(nodes.xs.copy(), nodes.ys.copy(), nodes.edges.copy(), elapsed, puzzle_solved, solved_time,
+                   initial_overlaps, remaining_overlaps)
+
+def save_game(filename, session):
+    """Write the whole game to filename (encrypted) and return the snapshot id."""
+    return write_snapshot(filename, session, load_key())
+
+def autosave_game(filename, snapshot_id, moved, session):
+    """Journal the nodes in moved on top of snapshot_id, or write a new snapshot of the
+    same game if that is not possible, and return the id of the snapshot the save now
+    builds on.
+    """
+    if append_journal(filename, snapshot_id, session, moved, load_key()):
+        return snapshot_id
+    return write_snapshot(filename, session, load_key())
+
+def load_game(filename):
+    session, snapshot_id = read_save(filename, load_key())
+    NODE_RADIUS = node_radius(len(session.xs))
+    nodes = Graph.from_arrays(session.xs, session.ys, session.edges, Node)
+
+    return (nodes, session.initial_overlaps, session.elapsed, session.solved_time, session.puzzle_solved,
+            session.remaining_overlaps, NODE_RADIUS, snapshot_id)
+
+def load_puzzle(filename, width):
+    """Load a save along with the spatial grid and crossing index for it, for the I/O thread."""
+    loaded = load_game(filename)
+    nodes = loaded[0]
+    spatial_grid = make_spatial_grid(nodes, width, loaded[6])
+    return loaded, spatial_grid, CrossingIndex(nodes, spatial_grid)
+
+def wake_for_puzzle(future):
+    # Run by the worker pool, which can finish a puzzle after the game has quit
+    if pygame.display.get_init():
+        pygame.event.post(pygame.event.Event(PUZZLE_READY))
+
+def solve_puzzle(graph, width, height):
+    """Return the crossing-free layout of graph, and the crossings of each of its edges
+    once laid out that way, for the I/O thread.
+    """
+    xs, ys = solve_layout(graph, width, height)
+    graph.xs[:] = xs
+    graph.ys[:] = ys
+    return (xs, ys), crossing_counts(graph)
+
+def main(fps=DEFAULT_FPS, profile=False, trace=None, pack_path=None, record=None, replay=None, seed=None,
+         cache=None):
+    screen = init_display(replay.size if replay else None)
+    SCREEN_WIDTH, SCREEN_HEIGHT = screen.get_size()
+    camera = logic.camera  # Wheel zooms, right-drag pans
+
+    # Frames, the clock, the mouse and puzzles all come through inputs, so a
+    # session can be recorded and played back (see replay.py)
+    if replay is not None:
+        inputs = replay
+        set_node_count(replay.trace['node_count'])
+    elif record:
+        inputs = InputRecorder(fps, record, (SCREEN_WIDTH, SCREEN_HEIGHT), logic.NODE_COUNT)
+    else:
+        inputs = LiveInput(fps)
+    save_file = inputs.save_file(SAVE_FILE)
+
+    pack = None  # Pre-generated puzzles, used for the node counts they cover
+    if pack_path:
+        try:
+            pack = PuzzlePack(pack_path)
+        except (OSError, ValueError) as e:
+            print(f"Cannot open puzzle pack {pack_path}: {e}")
+
+    # Every puzzle has a seed: the one given for the first, then drawn from
+    # a generator seeded with it, so a whole session can be started again
+    seeds = random.Random(seed)
+    first_seed = seed
+
+    def new_puzzle():
+        """Return (xs, ys, edges, seed, counts) for a puzzle of the current NODE_COUNT."""
+        nonlocal first_seed
+        if pack is not None and logic.NODE_COUNT in pack:
+            xs, ys, edges, _, counts = pack.puzzle(pack.choose(logic.NODE_COUNT), SCREEN_WIDTH, SCREEN_HEIGHT)
+            return xs, ys, edges, None, counts  # Scaled to the screen, so the seed alone does not rebuild it
+        new_seed = seeds.randrange(2 ** 32) if first_seed is None else first_seed
+        first_seed = None
+        if cache is not None:
+            xs, ys, edges, counts = cache.puzzle(logic.NODE_COUNT, SCREEN_WIDTH, SCREEN_HEIGHT, new_seed)
+            return xs, ys, edges, new_seed, counts
+        nodes = generate_puzzle(logic.NODE_COUNT, SCREEN_WIDTH, SCREEN_HEIGHT, new_seed)
+        return nodes.xs, nodes.ys, nodes.edges, new_seed, None
+
+    def finish_generating(future):
+        """Return a finished background puzzle, generating one here if the worker failed."""
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Background generation failed: {e}")
+            return new_puzzle()
+
+    def start_puzzle(make):
+        """Return (nodes, seed, counts) for the puzzle make() returns, or the one a replay has in its place."""
+        xs, ys, edges, new_seed, counts = inputs.puzzle(make)
+        return Graph.from_arrays(xs, ys, edges, Node), new_seed, counts
+
+    def reset_game(new_nodes, new_seed=None, counts=None):
+        """Resets the game with a new puzzle of the current NODE_COUNT."""
+        nonlocal nodes, spatial_grid, crossing_index, initial_overlaps, start_time, solved_time, puzzle_solved, remaining_overlaps
+        nonlocal solution, solved_counts, layout_wanted, animation, saved_id, selected_node, selection, box_from, group_from
+        nonlocal puzzle_seed
+        nodes = new_nodes
+        puzzle_seed = new_seed
+        selected_node = None  # A puzzle can arrive in the middle of a drag
+        selection = np.zeros(0, dtype=np.int64)
+        box_from = group_from = None
+        solution = solved_counts = layout_wanted = None
+        animation = None
+        saved_id = None  # Not autosaved until the player saves it
+        moved.clear()
+        camera.reset()
+        spatial_grid = make_spatial_grid(nodes, SCREEN_WIDTH, logic.NODE_RADIUS)
+        crossing_index = CrossingIndex(nodes, spatial_grid, counts)
+        initial_overlaps = crossing_index.overlaps
+        start_time = inputs.now
+        solved_time = None
+        puzzle_solved = False
+        remaining_overlaps = initial_overlaps
+
+    def use_layout(action):
+        """Solve the puzzle or hint a node, as action says, once the crossing-free layout of
+        the current nodes is there. It is worked out once per puzzle, on the I/O thread.
+        """
+        nonlocal layout_wanted
+        if solution is None:
+            if layout_wanted is None:
+                # A copy, as the graph is only read there
+                io_worker.submit('solve', solve_puzzle, Graph.from_arrays(nodes.xs, nodes.ys, nodes.edges),
+                                 SCREEN_WIDTH, SCREEN_HEIGHT, nodes=nodes)
+            layout_wanted = action  # Done by the loop once the layout has arrived
+        elif action == 'solve':
+            start_animation(range(len(nodes)), SOLVE_TIME)
+        else:
+            index = hint(nodes, *solution, crossing_index)
+            if index is not None:
+                start_animation([index], HINT_TIME)
+
+    def start_animation(indices, duration):
+        nonlocal animation, animation_start, animation_time
+        animation = Animation(nodes, indices, *solution)
+        animation_start = inputs.now
+        animation_time = duration
+
+    def select(indices):
+        """Make the nodes in indices the selected group, highlighted in place of the last one."""
+        nonlocal selection
+        nodes.highlighted[selection] = False
+        selection = np.asarray(indices, dtype=np.int64)
+        nodes.highlighted[selection] = True
+
+    def show_status(text, duration=STATUS_TIME):
+        nonlocal status_text, status_until
+        status_text = text
+        status_until = inputs.now + duration
+
+    def save_game_button():
+        nonlocal last_autosave
+        session = make_session(inputs.now, start_time, puzzle_solved, solved_time, remaining_overlaps, nodes,
+                               initial_overlaps)
+        io_worker.submit('save', save_game, save_file, session, nodes=nodes)
+        moved.clear()
+        last_autosave = inputs.now
+
+    def autosave():
+        nonlocal last_autosave
+        session = make_session(inputs.now, start_time, puzzle_solved, solved_time, remaining_overlaps, nodes,
+                               initial_overlaps)
+        io_worker.submit('autosave', autosave_game, save_file, saved_id, sorted(moved), session, nodes=nodes)
+        moved.clear()
+        last_autosave = inputs.now
+
+    def load_game_button():
+        io_worker.submit('load', load_puzzle, save_file, SCREEN_WIDTH)
+        show_status("Loading...", 60000)
+
+    def finish_io(event):
+        """Take in a finished save or load job."""
+        nonlocal nodes, spatial_grid, crossing_index, initial_overlaps, start_time, solved_time, puzzle_solved
+        nonlocal remaining_overlaps, saved_id, pending_puzzle, solution, solved_counts, layout_wanted, animation
+        nonlocal selected_node
+        nonlocal selection, box_from, group_from, puzzle_seed
+        if event.job == 'solve' and event.nodes is not nodes:
+            pass  # Worked out for a puzzle that has since been replaced
+        elif event.job == 'solve' and event.error is not None:
+            layout_wanted = None
+            print(f"Cannot solve this puzzle: {event.error}")
+            show_status("Cannot solve this puzzle")
+        elif event.job == 'solve':
+            solution, solved_counts = event.result
+        elif event.error is not None:
+            if event.job == 'load' and isinstance(event.error, FileNotFoundError):
+                message = "No saved game to load"
+            else:
+                message = f"{event.job.capitalize()} failed: {str(event.error) or type(event.error).__name__}"
+            print(message)
+            show_status(message)
+        elif event.job == 'load':
+            a, spatial_grid, crossing_index = event.result
+            pending_puzzle = None
+            solution = solved_counts = layout_wanted = None
+            animation = None
+            selected_node = None
+            selection = np.zeros(0, dtype=np.int64)
+            box_from = group_from = None
+            puzzle_seed = None  # Saves do not keep it
+            nodes = a[0]
+            initial_overlaps = a[1]
+            start_time = inputs.now - a[2]
+            solved_time = a[3]
+            puzzle_solved = a[4]
+            remaining_overlaps = a[5]
+            saved_id = a[7]
+            moved.clear()
+            camera.reset()
+            set_node_count(len(nodes))
+            show_status("Game loaded")
+        elif event.job == 'trace':
+            show_status(f"Wrote {event.result} frames to {event.path}")
+        elif event.nodes is nodes:
+            # A save of a game that has since been replaced is left alone
+            saved_id = event.result
+            if event.job == 'save':
+                show_status("Game saved")
+
+    try:
+        nodes, puzzle_seed, counts = start_puzzle(new_puzzle)
+    except RuntimeError as e:
+        print(e)
+        return
+
+    spatial_grid = make_spatial_grid(nodes, SCREEN_WIDTH, logic.NODE_RADIUS)
+    crossing_index = CrossingIndex(nodes, spatial_grid, counts)
+    initial_overlaps = crossing_index.overlaps
+
+    # New puzzles are built in worker processes while the game keeps running
+    puzzle_queue = inputs.puzzle_queue(SCREEN_WIDTH, SCREEN_HEIGHT, pack, seeds, cache)
+    puzzle_queue.prefetch(logic.NODE_COUNT)
+    pending_puzzle = None  # (node count, future) of the puzzle New Game is waiting for
+
+    solution = None  # Crossing-free layout of the current puzzle, once Solve or Hint needs it
+    solved_counts = None  # Crossings of each edge in that layout, for the index once Solve is done
+    layout_wanted = None  # 'solve' or 'hint', pressed while the layout was still being worked out
+    animation = None  # Nodes moving to their solved positions, one frame at a time
+    animation_start = animation_time = 0
+
+    # The save file is a snapshot plus a journal of moves, so autosaves
+    # only append the nodes moved since the last one. Only a game the player
+    # saved or loaded is autosaved, so a save is never replaced by another game.
+    saved_id = None  # Snapshot the save file holds for this game, if any
+    moved = set()  # Nodes moved since the last save
+    last_autosave = inputs.now
+    io_worker = IOWorker()  # Saves and loads, off the game loop
+    status_text = None  # Outcome of the last save or load
+    status_until = 0
+
+    selected_node = None
+    selection = np.zeros(0, dtype=np.int64)  # Nodes picked with a selection box, dragged as one
+    box_from = box_to = None  # Screen corners of the selection box while it is dragged out
+    group_from = None  # World position the selected group was last dragged to
+    pan_from = None  # Last mouse position while the view is being dragged
+    running = True
+    start_time = inputs.now
+    solved_time = None
+    puzzle_solved = False
+
+    button_rect = pygame.Rect(SCREEN_WIDTH - 150, 10, 140, 30)
+    input_box_rect = pygame.Rect(SCREEN_WIDTH - 150, 50, 140, 30)
+    highlight_button_rect = pygame.Rect(SCREEN_WIDTH - 150, 90, 140, 30)
+    solve_button_rect = pygame.Rect(SCREEN_WIDTH - 150, 130, 140, 30)
+    hint_button_rect = pygame.Rect(SCREEN_WIDTH - 150, 170, 140, 30)
+    load_button_rect = pygame.Rect(SCREEN_WIDTH - 150, SCREEN_HEIGHT - 40, 140, 30)  # Bottom-right corner
+    save_button_rect = pygame.Rect(SCREEN_WIDTH - 150, SCREEN_HEIGHT - 80, 140, 30)  # Above the Load button
+    input_text = ""
+    input_active = False
+
+    highlight_overlaps = False  # Track if overlaps should be highlighted
+    scene_layer = SceneLayer()  # Cached drawing of everything not being dragged
+    remaining_overlaps = initial_overlaps
+    busy = True  # Whether the next frame has to come on time, rather than when woken
+    wake_at = None
+    profiler = FrameProfiler()  # Per-stage frame timings, recorded while the overlay is up or for --trace
+    show_profile = profile
+    recording = bool(trace) or replay is not None  # Frames are kept whether or not the overlay is up
+    if profile or recording:
+        profiler.enable()
+
+    while running:
+        events = inputs.next_frame(busy, wake_at)
+        profiler.start_frame()  # Time spent waiting for the frame is not counted
+        if puzzle_solved:
+            elapsed_time = solved_time
+        else:
+            elapsed_time = (inputs.now - start_time) / 1000
+
+        if pending_puzzle is not None and inputs.puzzle_ready(pending_puzzle[1]):
+            count, future = pending_puzzle
+            pending_puzzle = None
+            set_node_count(count)
+            reset_game(*start_puzzle(lambda: finish_generating(future)))
+
+        if animation is not None:
+            arrived = animation.step((inputs.now - animation_start) / animation_time)
+            if len(animation.indices) == 1:
+                # A hinted node moves like a dragged one
+                hinted = nodes[int(animation.indices[0])]
+                hinted.dragging = not arrived
+                crossing_index.move_node(hinted)
+            else:
+                scene_layer.invalidate()  # Everything moves
+                if arrived:
+                    spatial_grid = make_spatial_grid(nodes, SCREEN_WIDTH, logic.NODE_RADIUS)
+                    crossing_index = CrossingIndex(nodes, spatial_grid, solved_counts)
+            if arrived:
+                moved.update(animation.indices.tolist())
+                animation = None
+
+        remaining_overlaps = crossing_index.overlaps  # Kept up to date while dragging
+        if initial_overlaps != 0:
+            progress = 1 - (remaining_overlaps / initial_overlaps)
+        else:
+            progress = 0
+
+        profiler.mark('update')
+
+        message = None
+        mouse_pos = inputs.mouse
+        button_hovered = button_rect.collidepoint(mouse_pos)
+        highlight_button_hovered = highlight_button_rect.collidepoint(mouse_pos)
+        solve_button_hovered = solve_button_rect.collidepoint(mouse_pos)
+        hint_button_hovered = hint_button_rect.collidepoint(mouse_pos)
+        save_button_hovered = save_button_rect.collidepoint(mouse_pos)
+        load_button_hovered = load_button_rect.collidepoint(mouse_pos)
+
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1:
+                    if button_hovered:
+                        if input_text.isdigit() and int(input_text) > 0:
+                            count = int(input_text)
+                        else:
+                            count = logic.NODE_COUNT
+                        future = puzzle_queue.take(count)
+                        future.add_done_callback(wake_for_puzzle)
+                        pending_puzzle = (count, future)
+                        input_text = ""
+                    elif highlight_button_hovered:
+                        highlight_overlaps = not highlight_overlaps
+                    elif solve_button_hovered:
+                        if animation is None:
+                            use_layout('solve')
+                    elif hint_button_hovered:
+                        if animation is None:
+                            use_layout('hint')
+                    elif save_button_hovered:
+                        save_game_button()  # Call save game function
+                    elif load_button_hovered:
+                        load_game_button()  # Finished by finish_io
+                    elif input_box_rect.collidepoint(mouse_pos):
+                        input_active = True
+                    else:
+                        input_active = False
+                    on_ui = (button_hovered or highlight_button_hovered or solve_button_hovered or
+                             hint_button_hovered or save_button_hovered or load_button_hovered or
+                             input_box_rect.collidepoint(mouse_pos))
+
+                    node = None if animation else find_hovered_node(spatial_grid, camera.to_world(*event.pos),
+                                                                    logic.NODE_RADIUS)
+                    if node and len(selection) > 1 and node.index in selection.tolist():
+                        # Pressing on a selected node drags the whole group
+                        group_from = camera.to_world(*event.pos)
+                        nodes.dragging[selection] = True
+                    elif node:
+                        select([])
+                        node.dragging = True
+                        selected_node = node
+                        for connected_node in node.connections:
+                            connected_node.highlighted = True
+                        selected_node.highlighted = True
+                    elif not on_ui:
+                        select([])
+                        box_from = box_to = event.pos
+                elif event.button == 3:
+                    pan_from = event.pos
+
+            elif event.type == pygame.MOUSEBUTTONUP:
+                if event.button == 3:
+                    pan_from = None
+                elif event.button == 1:
+                    if group_from is not None:
+                        moved.update(selection.tolist())
+                        nodes.dragging[selection] = False
+                        group_from = None
+                    if box_from is not None:
+                        select(nodes_in_box(nodes, camera.to_world(*box_from), camera.to_world(*event.pos)))
+                        box_from = box_to = None
+                    if selected_node:
+                        moved.add(selected_node.index)
+                        selected_node.dragging = False
+                        for connected_node in selected_node.connections:
+                            connected_node.highlighted = False
+                        selected_node.highlighted = False
+                        selected_node = None
+
+            elif event.type == pygame.MOUSEMOTION:
+                if selected_node:
+                    selected_node.x, selected_node.y = camera.to_world(*event.pos)
+                    crossing_index.move_node(selected_node)
+                if group_from is not None:
+                    x, y = camera.to_world(*event.pos)
+                    nodes.xs[selection] += x - group_from[0]
+                    nodes.ys[selection] += y - group_from[1]
+                    group_from = (x, y)
+                    # One update for the whole group, once per frame as motion is coalesced
+                    crossing_index.move_nodes(nodes, selection)
+                if box_from is not None:
+                    box_to = event.pos
+                if pan_from:
+                    camera.pan(event.pos[0] - pan_from[0], event.pos[1] - pan_from[1])
+                    pan_from = event.pos
+
+            elif event.type == pygame.MOUSEWHEEL:
+                camera.zoom_at(mouse_pos, ZOOM_STEP ** event.y)
+
+            elif event.type == pygame.KEYDOWN and event.key == RESET_VIEW_KEY:
+                camera.reset()
+
+            elif event.type == pygame.KEYDOWN and event.key == CLEAR_SELECTION_KEY and group_from is None:
+                select([])
+
+            elif event.type == IO_DONE:
+                finish_io(event)
+
+            elif event.type == pygame.KEYDOWN and event.key == PROFILE_KEY:
+                show_profile = not show_profile
+                if show_profile:
+                    profiler.enable()
+                elif not recording:
+                    profiler.disable()
+                scene_layer.invalidate()  # Clears the overlay when it goes away
+
+            elif event.type == pygame.KEYDOWN and event.key == TRACE_KEY:
+                path = time.strftime("untangle-trace-%Y%m%d-%H%M%S.json")
+                io_worker.submit('trace', write_trace, path, list(profiler.frames), path=path)
+
+            elif event.type == pygame.KEYDOWN:
+                if input_active:
+                    if event.key == pygame.K_BACKSPACE:
+                        input_text = input_text[:-1]
+                    elif event.key == pygame.K_RETURN:
+                        input_active = False
+                    else:
+                        input_text += event.unicode
+
+        if (layout_wanted is not None and solution is not None and animation is None and selected_node is None
+                and group_from is None):
+            # Left until the player lets go of any node they are dragging
+            use_layout(layout_wanted)
+            layout_wanted = None
+        if moved and saved_id is not None and inputs.now - last_autosave >= AUTOSAVE_INTERVAL:
+            autosave()
+        profiler.mark('events')
+
+        if remaining_overlaps == 0 and not puzzle_solved:
+            puzzle_solved = True
+            solved_time = elapsed_time
+
+        if remaining_overlaps == 0:
+            message = "Puzzle Solved!"
+
+        # The index is only rebuilt once a full solve has arrived
+        solving = animation is not None and len(animation.indices) > 1
+        dirty = draw_nodes_and_connections(nodes, message, progress, elapsed_time, highlight_overlaps,
+                                           None if solving else crossing_index, scene_layer, puzzle_seed)
+        if box_from is not None:
+            dirty.append(draw_selection_box(box_from, box_to))
+        dirty.append(draw_button("New Game", button_rect, button_hovered))
+        dirty.append(draw_button("Peek Knots", highlight_button_rect, highlight_button_hovered))
+        dirty.append(draw_button("Solve", solve_button_rect, solve_button_hovered))
+        dirty.append(draw_button("Hint", hint_button_rect, hint_button_hovered))
+        dirty.append(draw_button("Save Game", save_button_rect, save_button_hovered))  # Save button
+        dirty.append(draw_button("Load Game", load_button_rect, load_button_hovered))  # Load button
+        dirty.append(draw_input_box(input_text, input_box_rect, input_active))
+        if pending_puzzle is not None:
+            dirty.append(screen.blit(render_text(f"Generating {pending_puzzle[0]} nodes...", 24, TEXT_COLOR), (20, 90)))
+        if layout_wanted is not None:
+            dirty.append(screen.blit(render_text("Solving...", 24, TEXT_COLOR), (20, 130)))
+        if status_text is not None:
+            if inputs.now < status_until:
+                dirty.append(screen.blit(render_text(status_text, 24, TEXT_COLOR), (20, 110)))
+            else:
+                status_text = None
+
+        footer_text = render_text("Made by Oliver", 24, (200, 200, 200))
+        footer_rect = footer_text.get_rect()
+        footer_rect.bottomleft = (10, SCREEN_HEIGHT - 10)
+        dirty.append(screen.blit(footer_text, footer_rect))
+        if show_profile:
+            dirty.append(draw_profile_overlay(profiler.summary(), (10, footer_rect.top - 5)))
+        profiler.mark('draw')
+
+        scene_layer.present(dirty)  # Only the parts of the screen that changed
+        profiler.mark('present')
+        profiler.end_frame()
+
+        # Frames come on time while something moves. Otherwise the loop
+        # sleeps until input arrives or until the screen next has to change.
+        busy = animation is not None or progress_animating(progress)
+        wake_times = []
+        if not puzzle_solved:
+            wake_times.append(start_time + (int(elapsed_time) + 1) * 1000)  # The timer's next second
+        if status_text is not None:
+            wake_times.append(status_until)
+        if moved and saved_id is not None:
+            wake_times.append(last_autosave + AUTOSAVE_INTERVAL)
+        wake_at = min(wake_times, default=None)
+
+    if moved and saved_id is not None:
+        autosave()
+    if trace:
+        write_trace(trace, list(profiler.frames))
+    io_worker.shutdown()
+    inputs.finish(nodes, profiler.frames)
+    puzzle_queue.shutdown()
+    if pack is not None:
+        pack.close()
+    pygame.quit()
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Untangle")
+    parser.add_argument('--fps', type=int, default=DEFAULT_FPS, help="frame rate while anything is moving")
+    parser.add_argument('--profile', action='store_true', help="start with the frame-time overlay shown (F3 toggles it)")
+    parser.add_argument('--trace', metavar='PATH', help="record frame timings and write them to PATH on exit (.csv or .json)")
+    parser.add_argument('--pack', metavar='PATH', help="take puzzles from a pack built with packs.py")
+    parser.add_argument('--record', metavar='PATH',
+                        help="record the session's input to PATH on exit (.json or .json.gz), for replay.py")
+    parser.add_argument('--nodes', type=int, help="node count of the first puzzle")
+    parser.add_argument('--seed', type=int, help="seed of the first puzzle, as shown next to the node count")
+    parser.add_argument('--cache-dir', help=f"where generated puzzles are cached (default {default_directory()})")
+    parser.add_argument('--no-cache', action='store_true', help="always generate puzzles, and do not cache them")
+    args = parser.parse_args()
+    if args.nodes:
+        set_node_count(args.nodes)
+    main(args.fps, args.profile, args.trace, args.pack, args.record, seed=args.seed,
+         cache=None if args.no_cache else PuzzleCache(args.cache_dir))
@@ -0,0 +1,168 @@
+import argparse
+import mmap
+import os
+import random
+import shutil
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from prefetch import _generate  # The same puzzles, and counts, New Game would generate
+
+# Puzzle packs: puzzles generated ahead of time, so a kiosk never waits for
+# generation. A pack is one file:
+#
+#   header  magic b'KPAK', version u16, reserved u16, puzzles u64, width u32, height u32
+#   index   _ENTRY[puzzles], sorted by node count and then initial crossings
+#   data    for each puzzle: xs float64[n], ys float64[n], edges int32[e, 2],
+#           counts uint32[e] (the crossings of each edge), padded to 8 bytes
+#
+# Everything is little-endian and 8 byte aligned, so the game memory-maps
+# the file and reads the index and any puzzle straight out of it. Puzzles of
+# a node count sit next to each other in order of difficulty, which makes
+# picking one at random, or one within a range of crossings, a lookup.
+#
+#   python packs.py build --counts 10 30 100 --seeds 1000 --output puzzles.pack
+#   python packs.py info puzzles.pack
+
+VERSION = 2
+
+_MAGIC = b'KPAK'
+_HEADER = struct.Struct('<4sHHQII')
+_ENTRY = np.dtype([('nodes', '<u4'), ('edges', '<u4'), ('overlaps', '<u4'), ('reserved', '<u4'),
+                   ('seed', '<u8'), ('offset', '<u8')])
+
+def build_pack(path, counts, seeds, width, height, workers=None):
+    """Generate seeds puzzles (seeded 0, 1, 2, ...) of every node count in counts on
+    all cores and write them to a pack at path. Returns the number of puzzles.
+    """
+    tasks = [(count, seed) for count in counts for seed in range(seeds)]
+    entries = np.zeros(len(tasks), dtype=_ENTRY)
+    data = path + '.data'
+    with ProcessPoolExecutor(workers) as executor, open(data, 'wb') as f:
+        # Puzzles are written as they arrive, so only the index is kept in memory
+        results = executor.map(_generate, [count for count, _ in tasks], [width] * len(tasks), [height] * len(tasks),
+                               [seed for _, seed in tasks], chunksize=4)
+        for row, (xs, ys, edges, seed, crossings) in enumerate(results):
+            entries[row] = (len(xs), len(edges), np.count_nonzero(crossings), 0, seed, f.tell())
+            f.write(np.ascontiguousarray(xs, dtype='<f8').tobytes())
+            f.write(np.ascontiguousarray(ys, dtype='<f8').tobytes())
+            f.write(np.ascontiguousarray(edges, dtype='<i4').tobytes())
+            f.write(np.ascontiguousarray(crossings, dtype='<u4').tobytes())
+            f.write(bytes(-f.tell() % 8))
+
+    entries = entries[np.lexsort((entries['overlaps'], entries['nodes']))]
+    start = _HEADER.size + entries.nbytes
+    entries['offset'] += start
+    temporary = path + '.tmp'
+    try:
+        with open(temporary, 'wb') as f, open(data, 'rb') as source:
+            f.write(_HEADER.pack(_MAGIC, VERSION, 0, len(entries), width, height))
+            f.write(entries.tobytes())
+            shutil.copyfileobj(source, f, 1 << 20)
+        os.replace(temporary, path)
+    finally:
+        os.remove(data)
+    return len(entries)
+
+class PuzzlePack:
+    """A memory-mapped pack. Only the puzzles picked are read from disk."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < _HEADER.size:
+            raise ValueError("not a puzzle pack")
+        magic, version, _, count, self.width, self.height = _HEADER.unpack_from(self.map)
+        if magic != _MAGIC:
+            raise ValueError("not a puzzle pack")
+        if version != VERSION:
+            raise ValueError(f"unsupported pack version {version}")
+        # The index is small, so it is copied out and the map only ever
+        # has short-lived views of puzzle data into it
+        self.index = np.frombuffer(self.map, dtype=_ENTRY, count=count, offset=_HEADER.size).copy()
+        # Node count -> (start, stop) of its puzzles in the index
+        counts, starts, sizes = np.unique(self.index['nodes'], return_index=True, return_counts=True)
+        self.ranges = {count: (start, start + size)
+                       for count, start, size in zip(counts.tolist(), starts.tolist(), sizes.tolist())}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, node_count):
+        return node_count in self.ranges
+
+    def choose(self, node_count, min_overlaps=0, max_overlaps=None, rng=random):
+        """Return the index of a random puzzle of node_count with between min_overlaps and
+        max_overlaps initial crossings, or None if the pack has none.
+        """
+        start, stop = self.ranges.get(node_count, (0, 0))
+        overlaps = self.index['overlaps'][start:stop]
+        low = int(np.searchsorted(overlaps, min_overlaps, side='left'))
+        high = len(overlaps) if max_overlaps is None else int(np.searchsorted(overlaps, max_overlaps, side='right'))
+        if low >= high:
+            return None
+        return start + rng.randrange(low, high)
+
+    def puzzle(self, index, width=None, height=None):
+        """Return copies of (xs, ys, edges, seed, counts) for a puzzle, counts being
+        the crossings of each edge.
+
+        If width and height are given and differ from the size the pack was
+        built for, the layout is scaled to fit and centred. Scaling can move
+        nearly touching edges onto or off each other, so counts is None then.
+        """
+        entry = self.index[index]
+        count, offset = int(entry['nodes']), int(entry['offset'])
+        xs = np.frombuffer(self.map, dtype='<f8', count=count, offset=offset).astype(np.float64)
+        ys = np.frombuffer(self.map, dtype='<f8', count=count, offset=offset + 8 * count).astype(np.float64)
+        edges = np.frombuffer(self.map, dtype='<i4', count=2 * int(entry['edges']),
+                              offset=offset + 16 * count).reshape(-1, 2).astype(np.int64)
+        counts = np.frombuffer(self.map, dtype='<u4', count=len(edges),
+                               offset=offset + 16 * count + 8 * len(edges)).astype(np.int64)
+        if width and height and (width, height) != (self.width, self.height):
+            scale = min(width / self.width, height / self.height)
+            xs = (xs - self.width / 2) * scale + width / 2
+            ys = (ys - self.height / 2) * scale + height / 2
+            counts = None
+        return xs, ys, edges, int(entry['seed']), counts
+
+    def close(self):
+        self.map.close()
+
+def info(path):
+    pack = PuzzlePack(path)
+    print(f"{path}: {len(pack)} puzzles for {pack.width}x{pack.height}")
+    for count, (start, stop) in sorted(pack.ranges.items()):
+        overlaps = pack.index['overlaps'][start:stop]
+        print(f"{count:>6} nodes: {stop - start} puzzles, crossings {overlaps[0]} to {overlaps[-1]}"
+              f" (median {int(np.median(overlaps))})")
+    pack.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and inspect puzzle packs.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="generate puzzles into a pack")
+    build.add_argument('--counts', type=int, nargs='+', default=[10, 30, 100, 300], help="node counts to generate")
+    build.add_argument('--seeds', type=int, default=100, help="puzzles per node count, seeded 0, 1, 2, ...")
+    build.add_argument('--size', type=int, nargs=2, default=(1920, 1080), metavar=('WIDTH', 'HEIGHT'))
+    build.add_argument('--workers', type=int, help="worker processes, one per core by default")
+    build.add_argument('--output', default='puzzles.pack')
+    show = commands.add_parser('info', help="summarise a pack")
+    show.add_argument('path')
+    args = parser.parse_args()
+    if args.command == 'build' and args.seeds < 1:
+        parser.error("--seeds must be at least 1")
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        count = build_pack(args.output, args.counts, args.seeds, *args.size, workers=args.workers)
+        print(f"Wrote {count} puzzles to {args.output} in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+    else:
+        info(args.path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import functools
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import crossings
+import kernels
+from graph import Graph
+
+# Crossing counts for very large graphs on several cores, for batch jobs.
+# The positions and edges are copied once into shared memory, and each task
+# only names the part of the graph it covers, so nothing is pickled per task.
+#
+# Graphs whose edges are short next to the whole (solved or nearly solved
+# layouts) are cut into vertical strips, each holding about as many edges,
+# and every strip is checked by the single-threaded code on just the edges
+# that reach into it. Two edges cross at some point, that point is in some
+# strip and both edges reach into it, so the union over the strips is exact.
+# In a tangled graph most edges would reach into most strips. There the
+# marking sweep, which stops following an edge once it is marked, runs here
+# and only the batched test of the edges it left unmarked is split into
+# blocks of rows. Either way the result is the same as the single-threaded
+# functions give.
+#
+#   with CrossingPool(8) as pool:
+#       overlaps = core.count_overlaps(nodes, pool)
+
+TASKS_PER_WORKER = 4
+MAX_SPREAD = 2  # Average strips an edge reaches into above which strips are not used
+MIN_EDGES = 2000  # Below this the work is not worth sending to other processes
+
+_graph = None  # (names, Graph, coords) of the shared graph this worker last attached
+
+def _copies(specs):
+    """Return copies of the shared arrays specs describes."""
+    arrays = []
+    for name, shape, dtype in specs:
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            arrays.append(np.ndarray(shape, dtype, buffer=block.buf).copy())
+        finally:
+            block.close()
+    return arrays
+
+def _attach(specs):
+    """Return the Graph and edge coordinates of the shared graph specs describes."""
+    global _graph
+    names = tuple(name for name, _, _ in specs)
+    if _graph is None or _graph[0] != names:
+        graph = Graph.from_arrays(*_copies(specs))
+        _graph = (names, graph, graph.edge_coords())
+    return _graph[1], _graph[2]
+
+def _strip_crossings(specs, left, right, first_only):
+    graph, coords = _attach(specs)
+    low = np.minimum(coords[:, 0], coords[:, 2])
+    high = np.maximum(coords[:, 0], coords[:, 2])
+    strip = Graph.from_arrays(graph.xs, graph.ys, graph.edges[(high >= left) & (low <= right)])
+    if first_only:
+        return crossings.has_crossing(strip)
+    return crossings.crossing_edges(strip)
+
+def _rows_crossing(specs, row_specs, start, stop):
+    graph, coords = _attach(specs)
+    rows, against = _copies(row_specs)
+    return kernels.rows_crossing(coords, graph.edges, rows[start:stop], against)
+
+def _strips(coords, count):
+    """Return the (left, right) x ranges of count strips holding about the same number
+    of edge midpoints, and the average number of strips an edge reaches into.
+    """
+    low = np.minimum(coords[:, 0], coords[:, 2])
+    high = np.maximum(coords[:, 0], coords[:, 2])
+    cuts = np.quantile((low + high) / 2, np.arange(1, count) / count)
+    spread = float(np.mean(np.searchsorted(cuts, high, side='right') - np.searchsorted(cuts, low, side='left') + 1))
+    bounds = [-np.inf, *cuts.tolist(), np.inf]
+    return list(zip(bounds[:-1], bounds[1:])), spread
+
+class _SharedArrays:
+    """Copies of numpy arrays in shared memory blocks, unlinked by close."""
+
+    def __init__(self, *arrays):
+        self.blocks = []
+        self.specs = []  # (name, shape, dtype) of each array, all a worker needs to attach
+        try:
+            for array in arrays:
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                self.blocks.append(block)
+                np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+                self.specs.append((block.name, array.shape, array.dtype.str))
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+class CrossingPool:
+    """Worker processes that count crossings in parallel, giving the same results as
+    crossings.crossing_edges and has_crossing. Close it, or use it in a with block,
+    when done.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None  # Started on first use
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def _submit(self, function, *args):
+        if self.executor is None:
+            # Spawned rather than forked, so workers never inherit a display
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self.executor.submit(function, *args)
+
+    def _strips(self, nodes):
+        """Return the strips to split nodes into, or None if they would not divide the work."""
+        if len(nodes.edges) < MIN_EDGES:
+            return None
+        strips, spread = _strips(nodes.edge_coords(), self.workers * TASKS_PER_WORKER)
+        return strips if spread <= MAX_SPREAD else None
+
+    def crossing_edges(self, nodes):
+        """Return the set of edges that cross at least one other edge."""
+        if len(nodes.edges) < MIN_EDGES:
+            return crossings.crossing_edges(nodes)
+        shared = _SharedArrays(nodes.xs, nodes.ys, nodes.edges)
+        try:
+            strips = self._strips(nodes)
+            if strips is None:
+                return crossings.crossing_edges(nodes, functools.partial(self._rows_crossing, shared))
+            found = set()
+            for future in [self._submit(_strip_crossings, shared.specs, left, right, False) for left, right in strips]:
+                found |= future.result()
+            return found
+        finally:
+            shared.close()
+
+    def _rows_crossing(self, shared, coords, ends, rows, against):
+        """kernels.rows_crossing for the shared graph, split into blocks of rows."""
+        if len(rows) < MIN_EDGES:
+            return kernels.rows_crossing(coords, ends, rows, against)
+        row_arrays = _SharedArrays(rows, against)
+        try:
+            bounds = np.linspace(0, len(rows), self.workers * TASKS_PER_WORKER + 1).astype(int).tolist()
+            futures = [self._submit(_rows_crossing, shared.specs, row_arrays.specs, start, stop)
+                       for start, stop in zip(bounds[:-1], bounds[1:])]
+            return np.concatenate([future.result() for future in futures])
+        finally:
+            row_arrays.close()
+
+    def has_crossing(self, nodes):
+        """Return True as soon as any task finds two edges that cross."""
+        strips = self._strips(nodes)
+        if strips is None:
+            # Small, or tangled enough that the sweep finds a crossing almost at once
+            return crossings.has_crossing(nodes)
+        shared = _SharedArrays(nodes.xs, nodes.ys, nodes.edges)
+        try:
+            pending = {self._submit(_strip_crossings, shared.specs, left, right, True) for left, right in strips}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                if any(future.result() for future in done):
+                    for future in pending:
+                        future.cancel()
+                    # Tasks already running may not have copied the graph out yet
+                    wait(pending)
+                    return True
+            return False
+        finally:
+            shared.close()
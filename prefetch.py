@@ -0,0 +1,84 @@
+import collections
+import multiprocessing
+import random
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import core
+from crossings import crossing_counts
+from graph import Graph
+
+# Puzzles are generated in worker processes so the game keeps running while
+# a new one is built, and a few are generated ahead for the node count in
+# use so that New Game usually has one ready. Workers only import the
+# headless core and send back plain arrays. Node counts a puzzle pack has
+# are taken from the pack instead, with nothing generated. Workers also
+# count the crossings of every edge, which takes seconds for large puzzles,
+# so the game does not count them again. With a PuzzleCache, workers take
+# puzzles and their counts from it or add them to it.
+
+def _generate(node_count, width, height, seed, cache=None):
+    if cache is not None:
+        xs, ys, edges, counts = cache.puzzle(node_count, width, height, seed)
+        return xs, ys, edges, seed, counts
+    nodes = core.generate_puzzle(node_count, width, height, seed)
+    return nodes.xs, nodes.ys, nodes.edges, seed, crossing_counts(nodes)
+
+def _counted(xs, ys, edges):
+    return xs, ys, edges, None, crossing_counts(Graph.from_arrays(xs, ys, edges))
+
+class PuzzleQueue:
+    """Futures of (xs, ys, edges, seed, counts) puzzles, kept topped up per node count.
+
+    counts is the crossing count of every edge, and seed is None for puzzles
+    from the pack, which are scaled to fit. Pack puzzles that were rescaled
+    are counted again in a worker.
+    """
+
+    def __init__(self, width, height, depth=2, workers=2, pack=None, rng=random, cache=None):
+        self.width = width
+        self.height = height
+        self.pack = pack  # PuzzlePack to take puzzles from, if any
+        self.rng = rng  # Seeds are drawn from this
+        self.cache = cache  # PuzzleCache the workers use, if any
+        self.depth = depth  # Puzzles kept ready or in progress per node count
+        self.workers = workers
+        self.executor = None  # Started on first use
+        self.queues = {}  # Node count -> deque of futures, oldest first
+
+    def _start(self, function, *args):
+        if self.executor is None:
+            # Spawned rather than forked, so workers do not inherit the display
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self.executor.submit(function, *args)
+
+    def _submit(self, node_count):
+        seed = self.rng.randrange(2 ** 32)
+        return self._start(_generate, node_count, self.width, self.height, seed, self.cache)
+
+    def prefetch(self, node_count):
+        """Start generating puzzles of node_count until depth of them are queued."""
+        if self.pack is not None and node_count in self.pack:
+            return
+        queue = self.queues.setdefault(node_count, collections.deque())
+        while len(queue) < self.depth:
+            queue.append(self._submit(node_count))
+
+    def take(self, node_count):
+        """Return the future of the next puzzle of node_count and queue another in its place."""
+        if self.pack is not None and node_count in self.pack:
+            xs, ys, edges, _, counts = self.pack.puzzle(self.pack.choose(node_count), self.width, self.height)
+            if counts is None:
+                return self._start(_counted, xs, ys, edges)  # Rescaled, so counted again
+            future = Future()
+            future.set_result((xs, ys, edges, None, counts))
+            return future
+        queue = self.queues.setdefault(node_count, collections.deque())
+        future = queue.popleft() if queue else self._submit(node_count)
+        self.prefetch(node_count)
+        return future
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.queues = {}
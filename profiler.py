@@ -0,0 +1,124 @@
+import collections
+import csv
+import json
+import time
+
+import numpy as np
+
+import crossings
+import kernels
+
+# Frame-time instrumentation for the main loop. Each frame is split into
+# stages by calling mark() after each one, and the intersection tests run
+# during the frame are counted. Recorded frames feed the on-screen overlay
+# and can be written out as a CSV or JSON trace with write_trace. While the
+# profiler is off every call returns straight away and the intersection
+# tests are not wrapped.
+
+STAGES = ('update', 'events', 'draw', 'present')
+HISTORY = 10000  # Frames kept for export
+WINDOW = 120  # Most recent frames the overlay summarises
+
+class CallCounter:
+    """Counts do_lines_intersect calls and the segment pairs the batch kernels test."""
+
+    def __enter__(self):
+        self.counts = {'do_lines_intersect': 0, 'kernel_pair_tests': 0}
+        line_test = crossings.do_lines_intersect
+        batch_test = kernels.segments_touch
+
+        def counted_line_test(*args):
+            self.counts['do_lines_intersect'] += 1
+            return line_test(*args)
+
+        def counted_batch_test(first, second):
+            self.counts['kernel_pair_tests'] += np.broadcast(first[..., 0], second[..., 0]).size
+            return batch_test(first, second)
+
+        self.saved = [(crossings, 'do_lines_intersect', line_test), (kernels, 'segments_touch', batch_test)]
+        crossings.do_lines_intersect = counted_line_test
+        kernels.segments_touch = counted_batch_test
+        return self
+
+    def __exit__(self, *exc):
+        for module, name, value in self.saved:
+            setattr(module, name, value)
+
+class FrameProfiler:
+    """Per-stage frame timings and intersection test counts, recorded while enabled."""
+
+    def __init__(self, history=HISTORY):
+        self.enabled = False
+        self.frames = collections.deque(maxlen=history)  # One dict per frame
+        self.counter = None
+        self.row = None  # The frame being recorded
+
+    def enable(self):
+        if not self.enabled:
+            self.enabled = True
+            self.counter = CallCounter().__enter__()
+
+    def disable(self):
+        if self.enabled:
+            self.enabled = False
+            self.counter.__exit__(None, None, None)
+            self.counter = None
+            self.row = None
+
+    def start_frame(self):
+        if not self.enabled:
+            return
+        self.start = self.last = time.perf_counter()
+        self.counts = dict(self.counter.counts)
+        self.row = dict.fromkeys(STAGES, 0.0)
+
+    def mark(self, stage):
+        """Charge the time since the last mark to stage."""
+        if self.row is None:
+            return
+        now = time.perf_counter()
+        self.row[stage] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        if self.row is None:
+            return
+        row = {'start': self.start, 'frame': self.last - self.start}
+        row.update(self.row)
+        for name, count in self.counter.counts.items():
+            row[name] = count - self.counts[name]
+        self.frames.append(row)
+        self.row = None
+
+    def summary(self, window=WINDOW):
+        """Return FPS, p50 and p99 frame time, the stage with the most time and the
+        tests per frame over the last window frames, or None before there are two.
+        """
+        recent = list(self.frames)[-window:]
+        if len(recent) < 2:
+            return None
+        span = recent[-1]['start'] - recent[0]['start']
+        times = np.array([row['frame'] for row in recent])
+        totals = {stage: sum(row[stage] for row in recent) for stage in STAGES}
+        worst = max(STAGES, key=totals.get)
+        return {
+            'fps': (len(recent) - 1) / span if span > 0 else 0.0,
+            'p50': float(np.percentile(times, 50)),
+            'p99': float(np.percentile(times, 99)),
+            'worst_stage': worst,
+            'worst_time': totals[worst] / len(recent),
+            'do_lines_intersect': sum(row['do_lines_intersect'] for row in recent) / len(recent),
+            'kernel_pair_tests': sum(row['kernel_pair_tests'] for row in recent) / len(recent),
+        }
+
+def write_trace(path, frames):
+    """Write recorded frames to path, as CSV if it ends in .csv and JSON otherwise. Times are in seconds."""
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['start', 'frame', *STAGES, 'do_lines_intersect', 'kernel_pair_tests'])
+            writer.writeheader()
+            writer.writerows(frames)
+    else:
+        with open(path, 'w') as f:
+            json.dump({'stages': list(STAGES), 'frames': frames}, f, indent=1)
+    return len(frames)
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import zipfile
+
+import numpy as np
+
+import core
+from crossings import crossing_counts
+
+# Generated puzzles kept on disk, so a puzzle asked for again (the same
+# seed, node count and screen size, as with --seed or a shared seed) loads
+# instead of being generated and counted again. Each entry is an .npz file
+# named by a hash of what it was generated from, holding the positions,
+# the edges and the crossing count of every edge. Entries are written
+# atomically, so several processes can share a cache, and once it holds
+# more than max_bytes the least recently used entries are removed.
+
+VERSION = 1  # Part of every key, bump it when generation changes
+MAX_BYTES = 256 * 2 ** 20
+
+def default_directory():
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'untangle')
+
+class PuzzleCache:
+    def __init__(self, directory=None, max_bytes=MAX_BYTES):
+        self.directory = directory or default_directory()
+        self.max_bytes = max_bytes
+
+    def _path(self, node_count, width, height, seed):
+        key = f"{VERSION}:{node_count}:{width}x{height}:{seed}".encode()
+        return os.path.join(self.directory, hashlib.sha256(key).hexdigest()[:32] + '.npz')
+
+    def get(self, node_count, width, height, seed):
+        """Return (xs, ys, edges, counts) for a cached puzzle, or None if it is not cached."""
+        path = self._path(node_count, width, height, seed)
+        try:
+            with np.load(path) as entry:
+                puzzle = entry['xs'], entry['ys'], entry['edges'], entry['counts']
+            os.utime(path)  # Most recently used
+        except FileNotFoundError:
+            return None  # Not cached, or evicted meanwhile
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            # Cut short or damaged, so it is generated and stored again
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return puzzle
+
+    def put(self, node_count, width, height, seed, xs, ys, edges, counts):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(node_count, width, height, seed)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            np.savez(f, xs=xs, ys=ys, edges=edges, counts=counts)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        with os.scandir(self.directory) as found:
+            for entry in found:
+                if entry.name.endswith('.npz'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Another process got there first
+            total -= size
+
+    def puzzle(self, node_count, width, height, seed):
+        """Return (xs, ys, edges, counts) for the puzzle generate_puzzle builds from these,
+        from the cache if it is there and generated and stored otherwise.
+        """
+        cached = self.get(node_count, width, height, seed)
+        if cached is not None:
+            return cached
+        nodes = core.generate_puzzle(node_count, width, height, seed)
+        counts = crossing_counts(nodes)
+        try:
+            self.put(node_count, width, height, seed, nodes.xs, nodes.ys, nodes.edges, counts)
+        except OSError as e:
+            print(f"Cannot cache puzzle: {e}")
+        return nodes.xs, nodes.ys, nodes.edges, counts
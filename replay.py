@@ -0,0 +1,319 @@
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pygame.event
+import pygame.mouse
+import pygame.time
+
+import core
+from frames import FrameScheduler
+from prefetch import PuzzleQueue
+from profiler import STAGES
+from savefile import journal_path
+from saveio import IO_DONE
+
+# Input traces: a recording of everything the main loop takes in, so a real
+# session can be played back headless and its frame times measured.
+#
+# The loop reads its input through one of the classes here. LiveInput is
+# plain pygame. InputRecorder is the same, but also writes down every
+# frame's clock, mouse position and input events, the puzzles started and
+# the save file the session began with, and at the end the number of
+# crossings left. InputReplay feeds a trace back in with no waiting between
+# frames. Things that finish in the background (generating a puzzle, a save
+# or load) are waited for and handed over on the frame they arrived on in
+# the recording, so the replay reaches the same end state.
+#
+#   python main.py --record session.json.gz
+#   python replay.py session.json.gz --output replay.json
+#   python replay.py session.json.gz --compare replay.json
+
+VERSION = 1
+IO_TIMEOUT = 60  # Seconds to wait for a save or load before deciding the replay has gone astray
+
+_EVENTS = {pygame.MOUSEMOTION: 'motion', pygame.MOUSEBUTTONDOWN: 'down', pygame.MOUSEBUTTONUP: 'up',
+           pygame.MOUSEWHEEL: 'wheel', pygame.KEYDOWN: 'key', pygame.QUIT: 'quit', IO_DONE: 'io'}
+
+def _encode_event(event):
+    """Return event as a short list, or None for events the loop does not act on."""
+    name = _EVENTS.get(event.type)
+    if name == 'motion':
+        return [name, *event.pos]
+    if name in ('down', 'up'):
+        return [name, event.button, *event.pos]
+    if name == 'wheel':
+        return [name, event.y]
+    if name == 'key':
+        return [name, event.key, event.unicode]
+    if name == 'io':
+        return [name, event.job]
+    return None if name is None else [name]
+
+def _decode_event(row):
+    name = row[0]
+    if name == 'motion':
+        return pygame.event.Event(pygame.MOUSEMOTION, pos=tuple(row[1:3]))
+    if name in ('down', 'up'):
+        kind = pygame.MOUSEBUTTONDOWN if name == 'down' else pygame.MOUSEBUTTONUP
+        return pygame.event.Event(kind, button=row[1], pos=tuple(row[2:4]))
+    if name == 'wheel':
+        return pygame.event.Event(pygame.MOUSEWHEEL, y=row[1])
+    if name == 'key':
+        return pygame.event.Event(pygame.KEYDOWN, key=row[1], unicode=row[2])
+    return pygame.event.Event(pygame.QUIT)
+
+def _pack_array(array, dtype):
+    return base64.b64encode(np.ascontiguousarray(array, dtype=dtype).tobytes()).decode('ascii')
+
+def _unpack_array(text, dtype):
+    return np.frombuffer(base64.b64decode(text), dtype=dtype).copy()
+
+def _read_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return base64.b64encode(f.read()).decode('ascii')
+    except FileNotFoundError:
+        return None
+
+def digest(nodes):
+    """A short hash of every node position, to tell whether two runs ended in the same place."""
+    return hashlib.sha1(nodes.xs.tobytes() + nodes.ys.tobytes()).hexdigest()[:16]
+
+def read_trace(path):
+    with (gzip.open if path.endswith('.gz') else open)(path, 'rt') as f:
+        trace = json.load(f)
+    if trace.get('version') != VERSION:
+        raise ValueError(f"unsupported trace version {trace.get('version')}")
+    return trace
+
+def write_trace(path, trace):
+    with (gzip.open if path.endswith('.gz') else open)(path, 'wt') as f:
+        json.dump(trace, f, separators=(',', ':'))
+
+class LiveInput:
+    """Input straight from pygame, paced by a FrameScheduler."""
+
+    def __init__(self, fps):
+        self.scheduler = FrameScheduler(fps)
+        self.now = pygame.time.get_ticks()  # Clock at the start of the frame, in milliseconds
+        self.mouse = pygame.mouse.get_pos()  # Mouse position at the start of the frame
+
+    def next_frame(self, busy, wake_at):
+        events = self.scheduler.next_frame(busy, wake_at)
+        self.now = pygame.time.get_ticks()
+        self.mouse = pygame.mouse.get_pos()
+        return events
+
+    def puzzle_ready(self, future):
+        """Whether the background puzzle in future can be started this frame."""
+        return future.done()
+
+    def puzzle(self, make):
+        """Return the (xs, ys, edges, seed, counts) puzzle make() builds. seed is None if
+        the puzzle cannot be built again from it.
+        """
+        return make()
+
+    def puzzle_queue(self, width, height, pack, rng, cache):
+        return PuzzleQueue(width, height, pack=pack, rng=rng, cache=cache)
+
+    def save_file(self, path):
+        """Return the save file to use in place of path."""
+        return path
+
+    def finish(self, nodes, frames):
+        """Called once the loop ends, with the final nodes and the profiler's frames."""
+
+class InputRecorder(LiveInput):
+    """LiveInput that writes a trace of the session to path when it ends."""
+
+    def __init__(self, fps, path, size, node_count):
+        super().__init__(fps)
+        self.path = path
+        self.trace = {'version': VERSION, 'size': list(size), 'node_count': node_count, 'start': self.now,
+                      'puzzles': [], 'frames': []}
+        self.frame = None
+
+    def next_frame(self, busy, wake_at):
+        events = super().next_frame(busy, wake_at)
+        rows = [row for row in map(_encode_event, events) if row is not None]
+        self.frame = [self.now, *self.mouse, 0, rows]
+        self.trace['frames'].append(self.frame)
+        return events
+
+    def puzzle_ready(self, future):
+        ready = future.done()
+        if ready:
+            self.frame[3] = 1
+        return ready
+
+    def puzzle(self, make):
+        xs, ys, edges, seed, counts = make()
+        if seed is None:
+            self.trace['puzzles'].append({'xs': _pack_array(xs, '<f8'), 'ys': _pack_array(ys, '<f8'),
+                                          'edges': _pack_array(edges, '<i4')})
+        else:
+            self.trace['puzzles'].append({'nodes': len(xs), 'seed': seed})
+        return xs, ys, edges, seed, counts
+
+    def save_file(self, path):
+        # Loads in the replay read what the save file held when recording began
+        self.trace['save'] = [_read_file(path), _read_file(journal_path(path))]
+        return path
+
+    def finish(self, nodes, frames):
+        self.trace['overlaps'] = core.count_overlaps(nodes)
+        self.trace['digest'] = digest(nodes)
+        write_trace(self.path, self.trace)
+        print(f"Recorded {len(self.trace['frames'])} frames to {self.path}")
+
+class _NoQueue:
+    """Stands in for the PuzzleQueue during a replay, where puzzles come from the trace."""
+
+    def prefetch(self, node_count):
+        pass
+
+    def take(self, node_count):
+        return Future()  # Never finishes, InputReplay.puzzle_ready says when it is ready
+
+    def shutdown(self):
+        pass
+
+class InputReplay:
+    """Plays a trace back as fast as frames can be drawn."""
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.size = tuple(trace['size'])
+        self.frames = trace['frames']
+        self.puzzles = iter(trace['puzzles'])
+        self.row = -1
+        self.now = trace['start']
+        self.mouse = (0, 0)
+        self.held = []  # IO_DONE events taken off the queue ahead of the frame they are replayed on
+        self.directory = tempfile.mkdtemp(prefix='untangle-replay-')
+        self.result = None
+
+    def _io_done(self):
+        """Return the next real IO_DONE event, waiting for it if need be."""
+        give_up = time.monotonic() + IO_TIMEOUT
+        while not self.held:
+            self.held.extend(pygame.event.get(IO_DONE))
+            if not self.held:
+                if time.monotonic() > give_up:
+                    raise RuntimeError(f"frame {self.row}: the recording finished a save or load the replay never started")
+                pygame.time.wait(1)
+        return self.held.pop(0)
+
+    def next_frame(self, busy, wake_at):
+        pygame.event.get(exclude=IO_DONE)  # Real input plays no part
+        self.row += 1
+        if self.row >= len(self.frames):
+            return [pygame.event.Event(pygame.QUIT)]
+        self.now, x, y, _, rows = self.frames[self.row]
+        self.mouse = (x, y)
+        return [self._io_done() if row[0] == 'io' else _decode_event(row) for row in rows]
+
+    def puzzle_ready(self, future):
+        return self.row < len(self.frames) and bool(self.frames[self.row][3])
+
+    def puzzle(self, make):
+        puzzle = next(self.puzzles)
+        if 'seed' in puzzle:
+            nodes = core.generate_puzzle(puzzle['nodes'], *self.size, puzzle['seed'])
+            return nodes.xs, nodes.ys, nodes.edges, puzzle['seed'], None
+        edges = _unpack_array(puzzle['edges'], '<i4').astype(np.int64).reshape(-1, 2)
+        return _unpack_array(puzzle['xs'], '<f8'), _unpack_array(puzzle['ys'], '<f8'), edges, None, None
+
+    def puzzle_queue(self, width, height, pack, rng, cache):
+        return _NoQueue()
+
+    def save_file(self, path):
+        # A scratch copy, so the replay never touches the real save
+        scratch = os.path.join(self.directory, os.path.basename(path))
+        for data, target in zip(self.trace.get('save', [None, None]), (scratch, journal_path(scratch))):
+            if data is not None:
+                with open(target, 'wb') as f:
+                    f.write(base64.b64decode(data))
+        return scratch
+
+    def finish(self, nodes, frames):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.result = {'overlaps': core.count_overlaps(nodes), 'digest': digest(nodes), 'frames': list(frames)}
+
+def report(trace, result):
+    """Return frame-time percentiles in milliseconds, mean time per stage and whether the
+    replay ended with the crossings and node positions the recording did.
+    """
+    times = np.array([row['frame'] for row in result['frames']]) * 1000
+    return {
+        'frames': len(times),
+        'mean': float(times.mean()),
+        'p50': float(np.percentile(times, 50)),
+        'p90': float(np.percentile(times, 90)),
+        'p99': float(np.percentile(times, 99)),
+        'max': float(times.max()),
+        'stages': {stage: float(np.mean([row[stage] for row in result['frames']]) * 1000) for stage in STAGES},
+        'do_lines_intersect': int(sum(row['do_lines_intersect'] for row in result['frames'])),
+        'kernel_pair_tests': int(sum(row['kernel_pair_tests'] for row in result['frames'])),
+        'overlaps': result['overlaps'],
+        'expected_overlaps': trace.get('overlaps'),
+        'same_end_state': result['overlaps'] == trace.get('overlaps') and result['digest'] == trace.get('digest'),
+    }
+
+def compare(results, baseline, tolerance):
+    """Print the frame times that got slower than tolerance times the baseline and return how many."""
+    regressions = 0
+    for key in ('p50', 'p90', 'p99'):
+        ratio = results[key] / max(baseline[key], 1e-9)
+        if ratio > tolerance:
+            regressions += 1
+            print(f"slower: {key} {baseline[key]:.2f} ms -> {results[key]:.2f} ms ({ratio:.2f}x)", file=sys.stderr)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a trace recorded with main.py --record and time its frames.")
+    parser.add_argument('trace')
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--compare', help="earlier JSON report to check for slowdowns")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # Never open a real window
+    import main as game  # The game imports this module, so it is only loaded here
+
+    trace = read_trace(args.trace)
+    replay = InputReplay(trace)
+    game.main(replay=replay)
+    results = report(trace, replay.result)
+    print(f"{results['frames']} frames: p50 {results['p50']:.2f} ms, p99 {results['p99']:.2f} ms, "
+          f"max {results['max']:.2f} ms, {results['overlaps']} crossings left", file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+        print()
+
+    failed = not results['same_end_state']
+    if failed:
+        print(f"replay ended with {results['overlaps']} crossings, expected {results['expected_overlaps']}, "
+              f"or with the nodes elsewhere", file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            failed |= bool(compare(results, json.load(f), args.tolerance))
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
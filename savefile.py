@@ -0,0 +1,203 @@
+import json
+import os
+import secrets
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# Save files. A save is a snapshot of the whole puzzle plus an append-only
+# journal of the nodes moved since, so autosaving only writes what changed.
+#
+# Snapshot (UntangleSave.knot):
+#   preamble  magic b'KNOT', version u16, flags u16
+#   body      _HEADER, xs float64[n], ys float64[n], edges int32[e, 2]
+# Journal (UntangleSave.knot.journal):
+#   preamble  magic b'KNJL', version u16, flags u16, snapshot id u64
+#   chunks    length u32, then _STATUS and (index u32, x float64, y float64) records
+#
+# With the ENCRYPTED flag the snapshot body and every journal chunk are
+# Fernet tokens. Integers are little-endian and the arrays start on 8 byte
+# boundaries, so an unencrypted body can be read (or memory-mapped) straight
+# into numpy arrays. Saves from before the binary format, encrypted JSON,
+# are still read.
+#
+# Snapshots are written to a temporary file and renamed over the old one,
+# and a journal chunk cut short by a crash is skipped on load and cut off
+# before the next append, so a save is never left half written.
+
+VERSION = 1
+ENCRYPTED = 1
+
+_SNAPSHOT_MAGIC = b'KNOT'
+_JOURNAL_MAGIC = b'KNJL'
+_PREAMBLE = struct.Struct('<4sHH')
+_JOURNAL_PREAMBLE = struct.Struct('<4sHHQ')
+_HEADER = struct.Struct('<QIIqdIIB7x')  # Snapshot id, nodes, edges, elapsed ms, solved time, overlaps, solved
+_STATUS = struct.Struct('<qdIB3x')  # Elapsed ms, solved time, remaining overlaps, solved
+_LENGTH = struct.Struct('<I')
+_MOVE = np.dtype([('index', '<u4'), ('x', '<f8'), ('y', '<f8')])
+
+# Everything needed to carry on a game. elapsed is in milliseconds and
+# solved_time in seconds, or None while the puzzle is unsolved.
+Session = namedtuple('Session', 'xs ys edges elapsed puzzle_solved solved_time initial_overlaps remaining_overlaps')
+
+def journal_path(path):
+    return path + '.journal'
+
+def _fernet(key):
+    from cryptography.fernet import Fernet
+    return Fernet(key)
+
+def _seal(data, key):
+    return _fernet(key).encrypt(data) if key else data
+
+def _open(data, flags, key):
+    if flags & ENCRYPTED:
+        if not key:
+            raise ValueError("the save is encrypted and no key was given")
+        return _fernet(key).decrypt(bytes(data))
+    return data
+
+def _status(session):
+    solved_time = float('nan') if session.solved_time is None else session.solved_time
+    return int(session.elapsed), solved_time, int(session.remaining_overlaps), bool(session.puzzle_solved)
+
+def _write_atomic(path, data):
+    """Replace the file at path with data, so readers see either the old file or the new one."""
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+def write_snapshot(path, session, key=None):
+    """Write the whole session to path, start an empty journal for it and return the new snapshot id."""
+    snapshot_id = secrets.randbits(64)
+    xs = np.ascontiguousarray(session.xs, dtype='<f8')
+    ys = np.ascontiguousarray(session.ys, dtype='<f8')
+    edges = np.ascontiguousarray(session.edges, dtype='<i4').reshape(-1, 2)
+    elapsed, solved_time, remaining, solved = _status(session)
+    header = _HEADER.pack(snapshot_id, len(xs), len(edges), elapsed, solved_time,
+                          int(session.initial_overlaps), remaining, solved)
+    body = b''.join((header, xs.tobytes(), ys.tobytes(), edges.tobytes()))
+    flags = ENCRYPTED if key else 0
+    # The snapshot goes first: a crash before the journal is replaced leaves
+    # the old journal, which no longer matches and is ignored
+    _write_atomic(path, _PREAMBLE.pack(_SNAPSHOT_MAGIC, VERSION, flags) + _seal(body, key))
+    _write_atomic(journal_path(path), _JOURNAL_PREAMBLE.pack(_JOURNAL_MAGIC, VERSION, flags, snapshot_id))
+    return snapshot_id
+
+def _journal_end(data):
+    """Return the offset just past the last whole chunk of the journal in data."""
+    offset = _JOURNAL_PREAMBLE.size
+    while offset + _LENGTH.size <= len(data):
+        (length,) = _LENGTH.unpack_from(data, offset)
+        if offset + _LENGTH.size + length > len(data):
+            break
+        offset += _LENGTH.size + length
+    return offset
+
+def append_journal(path, snapshot_id, session, indices, key=None):
+    """Append the positions of the nodes in indices, and the session's timer and
+    progress, to the journal of the snapshot at path.
+
+    Returns False without writing anything if a new snapshot should be
+    written instead: the journal belongs to a different snapshot, or it has
+    grown larger than the snapshot itself.
+    """
+    try:
+        with open(journal_path(path), 'rb') as f:
+            data = f.read()  # No larger than the snapshot, or it is not appended to
+        snapshot_size = os.path.getsize(path)
+    except OSError:
+        return False
+    if len(data) < _JOURNAL_PREAMBLE.size:
+        return False
+    magic, version, flags, journal_id = _JOURNAL_PREAMBLE.unpack_from(data)
+    if (magic, version, journal_id) != (_JOURNAL_MAGIC, VERSION, snapshot_id) or bool(flags & ENCRYPTED) != bool(key):
+        return False
+    if len(data) > snapshot_size:
+        return False
+
+    indices = np.fromiter(indices, dtype=np.int64)
+    moves = np.empty(len(indices), dtype=_MOVE)
+    moves['index'] = indices
+    moves['x'] = np.asarray(session.xs)[indices]
+    moves['y'] = np.asarray(session.ys)[indices]
+    chunk = _seal(_STATUS.pack(*_status(session)) + moves.tobytes(), key)
+    with open(journal_path(path), 'r+b') as f:
+        # A chunk cut short by a crash would swallow the ones after it
+        f.seek(_journal_end(data))
+        f.truncate()
+        f.write(_LENGTH.pack(len(chunk)) + chunk)
+    return True
+
+def _read_legacy(data, key):
+    """Read an encrypted JSON save written before the binary format."""
+    if not key:
+        raise ValueError("not a save file, or an old save and no key was given")
+    save_data = json.loads(_fernet(key).decrypt(data).decode())
+    nodes = save_data['nodes']
+    edges = [(node['index'], other) for node in nodes for other in node['connections'] if node['index'] < other]
+    return Session(np.array([node['x'] for node in nodes], dtype=np.float64),
+                   np.array([node['y'] for node in nodes], dtype=np.float64),
+                   np.array(edges, dtype=np.int64).reshape(-1, 2),
+                   save_data['elapsed_time'], save_data['puzzle_solved'], save_data['solved_time'],
+                   save_data['initial_overlaps'], save_data['remaining_overlaps'])
+
+def _replay(session, snapshot_id, path, key):
+    """Apply the journal chunks written for snapshot_id to session."""
+    try:
+        with open(journal_path(path), 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return session
+    if len(data) < _JOURNAL_PREAMBLE.size:
+        return session
+    magic, version, flags, journal_id = _JOURNAL_PREAMBLE.unpack_from(data)
+    if (magic, version, journal_id) != (_JOURNAL_MAGIC, VERSION, snapshot_id):
+        return session  # Left over from an older snapshot
+
+    xs, ys = session.xs.copy(), session.ys.copy()
+    status = None
+    offset = _JOURNAL_PREAMBLE.size
+    end = _journal_end(data)  # Past it is a chunk cut short by a crash while it was being written
+    while offset < end:
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        chunk = _open(data[offset:offset + length], flags, key)
+        offset += length
+        status = _STATUS.unpack_from(chunk)
+        moves = np.frombuffer(chunk, dtype=_MOVE, offset=_STATUS.size)
+        xs[moves['index']] = moves['x']
+        ys[moves['index']] = moves['y']
+    if status is None:
+        return session
+    elapsed, solved_time, remaining, solved = status
+    return session._replace(xs=xs, ys=ys, elapsed=elapsed, puzzle_solved=bool(solved), remaining_overlaps=remaining,
+                            solved_time=None if np.isnan(solved_time) else solved_time)
+
+def read_save(path, key=None):
+    """Return (session, snapshot id) for the save at path, with its journal applied.
+
+    The snapshot id is None for saves in the old JSON format, which have no journal.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()  # The whole snapshot in one read
+    if len(data) < _PREAMBLE.size or data[:4] != _SNAPSHOT_MAGIC:
+        return _read_legacy(data, key), None
+    magic, version, flags = _PREAMBLE.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"unsupported save version {version}")
+
+    body = _open(memoryview(data)[_PREAMBLE.size:], flags, key)
+    snapshot_id, count, edge_count, elapsed, solved_time, initial, remaining, solved = _HEADER.unpack_from(body)
+    offset = _HEADER.size
+    xs = np.frombuffer(body, dtype='<f8', count=count, offset=offset)
+    ys = np.frombuffer(body, dtype='<f8', count=count, offset=offset + 8 * count)
+    edges = np.frombuffer(body, dtype='<i4', count=2 * edge_count, offset=offset + 16 * count).reshape(-1, 2)
+    session = Session(xs.astype(np.float64), ys.astype(np.float64), edges.astype(np.int64), elapsed, bool(solved),
+                      None if np.isnan(solved_time) else solved_time, initial, remaining)
+    return _replay(session, snapshot_id, path, key), snapshot_id
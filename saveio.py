@@ -0,0 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame.event
+
+# Save and load jobs run one at a time, in order, on a background thread, so
+# encryption and file I/O never hold up a frame. When a job finishes an
+# IO_DONE event is posted back to the game loop with the job's name, its
+# result and the exception it raised (or None), plus any details given when
+# it was submitted. Jobs must be handed copies of anything the game loop
+# keeps changing.
+
+IO_DONE = pygame.event.custom_type()
+
+class IOWorker:
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='save-io')
+
+    def submit(self, job, function, *args, **details):
+        """Run function(*args) in the background and post an IO_DONE event when it finishes."""
+        future = self.executor.submit(function, *args)
+        future.add_done_callback(lambda future: self._post(job, future, details))
+
+    def _post(self, job, future, details):
+        error = future.exception()
+        result = None if error is not None else future.result()
+        pygame.event.post(pygame.event.Event(IO_DONE, job=job, result=result, error=error, **details))
+
+    def shutdown(self):
+        """Wait for the jobs already submitted, such as a last autosave."""
+        self.executor.shutdown(wait=True)
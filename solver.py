@@ -0,0 +1,585 @@
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+import core
+import kernels
+from parallel import CrossingPool
+
+# Automatic solving. A crossing-free layout is found without looking at the
+# current positions at all:
+#
+#   1. The left-right planarity test (Brandes, "The Left-Right Planarity
+#      Test") gives a planar embedding, the order of the edges around every
+#      node.
+#   2. Edges are added until every face is a simple cycle, and then until
+#      every face except the largest one is a triangle.
+#   3. The largest face is pinned to a circle and every other node is put at
+#      the average position of its neighbours (Tutte's barycentric method),
+#      which for a graph like this one draws every face convex.
+#
+# Dropping the added edges again leaves a layout of the puzzle with no
+# crossings. Step 3 is a sparse linear system, solved with numpy by
+# conjugate gradients over all nodes at once.
+#
+#   python solver.py --counts 10 100 1000 --seeds 20
+
+class _Interval:
+    __slots__ = ('low', 'high')
+
+    def __init__(self, low=None, high=None):
+        self.low = low
+        self.high = high
+
+    def empty(self):
+        return self.low is None and self.high is None
+
+    def copy(self):
+        return _Interval(self.low, self.high)
+
+    def conflicting(self, edge, lowpt):
+        return not self.empty() and lowpt[self.high] > lowpt[edge]
+
+class _ConflictPair:
+    __slots__ = ('left', 'right')
+
+    def __init__(self, left=None, right=None):
+        self.left = left if left is not None else _Interval()
+        self.right = right if right is not None else _Interval()
+
+    def swap(self):
+        self.left, self.right = self.right, self.left
+
+    def lowest(self, lowpt):
+        if self.left.empty():
+            return lowpt[self.right.low]
+        if self.right.empty():
+            return lowpt[self.left.low]
+        return min(lowpt[self.left.low], lowpt[self.right.low])
+
+class Embedding:
+    """The clockwise order of the neighbours around every node of a plane graph."""
+
+    def __init__(self, node_count):
+        self.cw = [{} for _ in range(node_count)]  # Node -> {neighbour: next neighbour clockwise}
+        self.ccw = [{} for _ in range(node_count)]
+        self.first = [None] * node_count
+
+    def __len__(self):
+        return len(self.first)
+
+    def has_edge(self, start, end):
+        return end in self.cw[start]
+
+    def add_cw(self, start, end, reference):
+        """Put end directly clockwise of reference around start."""
+        cw, ccw = self.cw[start], self.ccw[start]
+        if reference is None:
+            cw[end] = ccw[end] = end
+            self.first[start] = end
+            return
+        after = cw[reference]
+        cw[reference] = end
+        cw[end] = after
+        ccw[after] = end
+        ccw[end] = reference
+
+    def add_ccw(self, start, end, reference):
+        """Put end directly counterclockwise of reference around start."""
+        if reference is None:
+            self.add_cw(start, end, None)
+            return
+        self.add_cw(start, end, self.ccw[start][reference])
+        if reference == self.first[start]:
+            self.first[start] = end
+
+    def add_first(self, start, end):
+        self.add_ccw(start, end, self.first[start])
+
+    def add_edge(self, first, second, around):
+        """Add an edge across the face corner first-around-second."""
+        self.add_cw(first, second, around)
+        self.add_ccw(second, first, around)
+
+    def next_half_edge(self, start, end):
+        """Return the half edge after start -> end on the face to its right."""
+        return end, self.ccw[end][start]
+
+    def edges(self):
+        return [(a, b) for a in range(len(self.cw)) for b in self.cw[a] if a < b]
+
+class _LeftRight:
+    """State of one run of the left-right planarity test."""
+
+    def __init__(self, adjacency):
+        count = len(adjacency)
+        self.adjacency = adjacency
+        self.height = [None] * count
+        self.parent_edge = [None] * count
+        self.oriented = [[] for _ in range(count)]  # Neighbours each node's edges point to
+        self.roots = []
+        self.lowpt = {}
+        self.lowpt2 = {}
+        self.nesting_depth = {}
+        self.ref = {}
+        self.side = {}
+        self.lowpt_edge = {}
+        self.stack_bottom = {}
+        self.stack = []  # Conflict pairs
+
+    def embed(self):
+        """Return the Embedding, or None if the graph is not planar."""
+        for v in range(len(self.adjacency)):
+            if self.height[v] is None:
+                self.height[v] = 0
+                self.roots.append(v)
+                self._orient(v)
+
+        for v, out in enumerate(self.oriented):
+            out.sort(key=lambda w: self.nesting_depth[v, w])
+        for root in self.roots:
+            if not self._test(root):
+                return None
+
+        for edge in self.nesting_depth:
+            self.nesting_depth[edge] *= self._sign(edge)
+        embedding = Embedding(len(self.adjacency))
+        for v, out in enumerate(self.oriented):
+            out.sort(key=lambda w: self.nesting_depth[v, w])
+            previous = None
+            for w in out:
+                embedding.add_cw(v, w, previous)
+                previous = w
+        left_ref, right_ref = {}, {}
+        for root in self.roots:
+            self._embed(root, embedding, left_ref, right_ref)
+
+        # Each root is a separate component, joined here by one edge each
+        for first, second in zip(self.roots, self.roots[1:]):
+            embedding.add_first(first, second)
+            embedding.add_first(second, first)
+        return embedding
+
+    def _orient(self, root):
+        # Depth-first search giving every edge a direction, with an explicit
+        # stack since puzzles can be far deeper than the recursion limit
+        stack = [root]
+        position = {}  # Node -> index of its next edge
+        resumed = set()  # Tree edges whose subtree is done
+        oriented = set()
+        while stack:
+            v = stack.pop()
+            e = self.parent_edge[v]
+            neighbours = self.adjacency[v]
+            i = position.get(v, 0)
+            while i < len(neighbours):
+                w = neighbours[i]
+                vw = (v, w)
+                if vw not in resumed:
+                    if vw in oriented or (w, v) in oriented:
+                        i += 1
+                        continue
+                    oriented.add(vw)
+                    self.oriented[v].append(w)
+                    self.lowpt[vw] = self.lowpt2[vw] = self.height[v]
+                    if self.height[w] is None:  # Tree edge
+                        self.parent_edge[w] = vw
+                        self.height[w] = self.height[v] + 1
+                        resumed.add(vw)
+                        position[v] = i
+                        stack.append(v)
+                        stack.append(w)
+                        break
+                    self.lowpt[vw] = self.height[w]  # Back edge
+
+                # Nesting order of the edge, and the lowpoints of its parent
+                self.nesting_depth[vw] = 2 * self.lowpt[vw] + (self.lowpt2[vw] < self.height[v])
+                if e is not None:
+                    if self.lowpt[vw] < self.lowpt[e]:
+                        self.lowpt2[e] = min(self.lowpt[e], self.lowpt2[vw])
+                        self.lowpt[e] = self.lowpt[vw]
+                    elif self.lowpt[vw] > self.lowpt[e]:
+                        self.lowpt2[e] = min(self.lowpt2[e], self.lowpt[vw])
+                    else:
+                        self.lowpt2[e] = min(self.lowpt2[e], self.lowpt2[vw])
+                i += 1
+
+    def _test(self, root):
+        stack = [root]
+        position = {}
+        resumed = set()
+        while stack:
+            v = stack.pop()
+            e = self.parent_edge[v]
+            out = self.oriented[v]
+            i = position.get(v, 0)
+            descended = False
+            while i < len(out):
+                w = out[i]
+                ei = (v, w)
+                if ei not in resumed:
+                    self.stack_bottom[ei] = self.stack[-1] if self.stack else None
+                    if ei == self.parent_edge[w]:
+                        resumed.add(ei)
+                        position[v] = i
+                        stack.append(v)
+                        stack.append(w)
+                        descended = True
+                        break
+                    self.lowpt_edge[ei] = ei
+                    self.stack.append(_ConflictPair(right=_Interval(ei, ei)))
+
+                # Integrate the return edges of ei
+                if self.lowpt[ei] < self.height[v]:
+                    if i == 0:
+                        self.lowpt_edge[e] = self.lowpt_edge[ei]
+                    elif not self._add_constraints(ei, e):
+                        return False
+                i += 1
+            if not descended and e is not None:
+                self._remove_back_edges(e)
+        return True
+
+    def _add_constraints(self, ei, e):
+        lowpt = self.lowpt
+        pair = _ConflictPair()
+        # Return edges of ei all go on the right
+        while True:
+            other = self.stack.pop()
+            if not other.left.empty():
+                other.swap()
+            if not other.left.empty():
+                return False
+            if lowpt[other.right.low] > lowpt[e]:
+                if pair.right.empty():
+                    pair.right = other.right.copy()
+                else:
+                    self.ref[pair.right.low] = other.right.high
+                pair.right.low = other.right.low
+            else:
+                self.ref[other.right.low] = self.lowpt_edge[e]
+            if (self.stack[-1] if self.stack else None) is self.stack_bottom[ei]:
+                break
+
+        # Return edges of earlier siblings that conflict with them go on the left
+        while self.stack and (self.stack[-1].left.conflicting(ei, lowpt) or
+                              self.stack[-1].right.conflicting(ei, lowpt)):
+            other = self.stack.pop()
+            if other.right.conflicting(ei, lowpt):
+                other.swap()
+            if other.right.conflicting(ei, lowpt):
+                return False
+            self.ref[pair.right.low] = other.right.high
+            if other.right.low is not None:
+                pair.right.low = other.right.low
+            if pair.left.empty():
+                pair.left = other.left.copy()
+            else:
+                self.ref[pair.left.low] = other.left.high
+            pair.left.low = other.left.low
+
+        if not (pair.left.empty() and pair.right.empty()):
+            self.stack.append(pair)
+        return True
+
+    def _remove_back_edges(self, e):
+        u = e[0]
+        # Drop conflict pairs whose return edges all end at u
+        while self.stack and self.stack[-1].lowest(self.lowpt) == self.height[u]:
+            pair = self.stack.pop()
+            if pair.left.low is not None:
+                self.side[pair.left.low] = -1
+
+        if self.stack:
+            # Trim the return edges ending at u from the one left on top
+            pair = self.stack.pop()
+            while pair.left.high is not None and pair.left.high[1] == u:
+                pair.left.high = self.ref.get(pair.left.high)
+            if pair.left.high is None and pair.left.low is not None:
+                self.ref[pair.left.low] = pair.right.low
+                self.side[pair.left.low] = -1
+                pair.left.low = None
+            while pair.right.high is not None and pair.right.high[1] == u:
+                pair.right.high = self.ref.get(pair.right.high)
+            if pair.right.high is None and pair.right.low is not None:
+                self.ref[pair.right.low] = pair.left.low
+                self.side[pair.right.low] = -1
+                pair.right.low = None
+            self.stack.append(pair)
+
+        # e goes on the side of its highest return edge
+        if self.lowpt[e] < self.height[u]:
+            high_left = self.stack[-1].left.high
+            high_right = self.stack[-1].right.high
+            if high_left is not None and (high_right is None or self.lowpt[high_left] > self.lowpt[high_right]):
+                self.ref[e] = high_left
+            else:
+                self.ref[e] = high_right
+
+    def _sign(self, edge):
+        chain = []
+        while self.ref.get(edge) is not None:
+            chain.append(edge)
+            edge = self.ref[edge]
+        side = self.side.get(edge, 1)
+        for link in reversed(chain):
+            side *= self.side.get(link, 1)
+            self.side[link] = side
+            self.ref[link] = None
+        return side
+
+    def _embed(self, root, embedding, left_ref, right_ref):
+        stack = [root]
+        position = {}
+        while stack:
+            v = stack.pop()
+            out = self.oriented[v]
+            i = position.get(v, 0)
+            while i < len(out):
+                w = out[i]
+                i += 1
+                if (v, w) == self.parent_edge[w]:
+                    embedding.add_first(w, v)
+                    left_ref[v] = right_ref[v] = w
+                    position[v] = i
+                    stack.append(v)
+                    stack.append(w)
+                    break
+                if self.side.get((v, w), 1) == 1:
+                    embedding.add_cw(w, v, right_ref[w])
+                else:
+                    embedding.add_ccw(w, v, left_ref[w])
+                    left_ref[w] = v
+
+def planar_embedding(node_count, edges):
+    """Return an Embedding of the graph, or None if it cannot be drawn without crossings.
+
+    Separate components are joined by an extra edge, so the embedding is
+    always connected.
+    """
+    adjacency = [[] for _ in range(node_count)]
+    for a, b in edges:
+        adjacency[a].append(b)
+        adjacency[b].append(a)
+    if node_count > 2 and len(edges) > 3 * node_count - 6:
+        return None  # Too many edges for any planar graph
+    return _LeftRight(adjacency).embed()
+
+def _simple_face(embedding, start, end, visited):
+    """Walk the face to the right of start -> end, splitting off corners at nodes met twice.
+
+    Returns the nodes around what is left of the face, or None if the face
+    was already walked from another half edge.
+    """
+    if (start, end) in visited:
+        return None
+    visited.add((start, end))
+    face = [start]
+    on_face = {start}
+    v1, v2 = start, end
+    _, v3 = embedding.next_half_edge(v1, v2)
+    while v2 != start or v3 != end:
+        if v2 in on_face:
+            # v2 is a cut node. The new edge closes off the triangle
+            # v1, v2, v3 and the walk carries on along it.
+            embedding.add_edge(v1, v3, v2)
+            visited.add((v2, v3))
+            visited.add((v3, v1))
+            v2 = v1
+        else:
+            on_face.add(v2)
+            face.append(v2)
+        v1 = v2
+        v2, v3 = embedding.next_half_edge(v2, v3)
+        visited.add((v1, v2))
+    return face
+
+def _triangulate_face(embedding, v1, v2):
+    _, v3 = embedding.next_half_edge(v1, v2)
+    _, v4 = embedding.next_half_edge(v2, v3)
+    if v1 in (v2, v3):
+        return
+    while v1 != v4:
+        if embedding.has_edge(v1, v3):
+            # The chord already runs outside this face, so fan from further on
+            v1, v2, v3 = v2, v3, v4
+        else:
+            embedding.add_edge(v1, v3, v2)
+            v2, v3 = v3, v4
+        _, v4 = embedding.next_half_edge(v2, v3)
+
+def triangulate(embedding):
+    """Add edges until every face but the largest is a triangle, and return the largest face."""
+    visited = set()
+    faces = []
+    for v in range(len(embedding)):
+        for w in list(embedding.cw[v]):
+            face = _simple_face(embedding, v, w, visited)
+            if face:
+                faces.append(face)
+    outer = max(faces, key=len)
+    for face in faces:
+        if face is not outer:
+            _triangulate_face(embedding, face[0], face[1])
+    return outer
+
+def tutte_layout(node_count, edges, outer, center, radius, tolerance=1e-13):
+    """Return (xs, ys) with the outer nodes evenly spaced on a circle and every
+    other node at the average position of its neighbours.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    sources = np.concatenate((edges[:, 0], edges[:, 1]))
+    targets = np.concatenate((edges[:, 1], edges[:, 0]))
+    degrees = np.bincount(sources, minlength=node_count).astype(np.float64)
+    free = np.ones(node_count, dtype=bool)
+    free[outer] = False
+
+    fixed = np.zeros((node_count, 2))
+    angles = 2 * math.pi * np.arange(len(outer)) / len(outer)
+    fixed[outer, 0] = center[0] + radius * np.cos(angles)
+    fixed[outer, 1] = center[1] + radius * np.sin(angles)
+
+    def neighbour_sum(positions):
+        return np.stack([np.bincount(sources, positions[targets, k], node_count) for k in range(2)], axis=1)
+
+    def apply(positions):
+        result = degrees[:, None] * positions - neighbour_sum(positions)
+        result[~free] = 0
+        return result
+
+    # Conjugate gradients for x and y side by side, preconditioned by the
+    # degrees, on the free nodes with the circle as the right hand side
+    rhs = neighbour_sum(fixed)
+    rhs[~free] = 0
+    scale = np.where(free, 1 / np.maximum(degrees, 1), 0)[:, None]
+    solution = np.where(free[:, None], np.asarray(center, dtype=np.float64), 0)
+    residual = rhs - apply(solution)
+    step = scale * residual
+    size = (residual * step).sum(axis=0)
+    limit = (tolerance ** 2) * (rhs ** 2).sum(axis=0).max()
+    for _ in range(10 * node_count + 100):
+        if (residual ** 2).sum(axis=0).max() <= limit:
+            break
+        pushed = apply(step)
+        alpha = size / np.where((step * pushed).sum(axis=0) == 0, 1, (step * pushed).sum(axis=0))
+        solution += alpha * step
+        residual -= alpha * pushed
+        preconditioned = scale * residual
+        new_size = (residual * preconditioned).sum(axis=0)
+        step = preconditioned + new_size / np.where(size == 0, 1, size) * step
+        size = new_size
+
+    positions = np.where(free[:, None], solution, fixed)
+    return positions[:, 0], positions[:, 1]
+
+def solve_layout(nodes, width, height, margin=0.05):
+    """Return (xs, ys) arrays placing the nodes with no crossings, centred on the play area.
+
+    Raises ValueError if the graph is not planar.
+    """
+    count = len(nodes)
+    center = (width / 2, height / 2)
+    radius = min(width, height) * (0.5 - margin)
+    if count < 3:
+        angles = 2 * math.pi * np.arange(count) / max(count, 1)
+        return center[0] + radius * np.cos(angles), center[1] + radius * np.sin(angles)
+
+    embedding = planar_embedding(count, nodes.edges.tolist())
+    if embedding is None:
+        raise ValueError("the puzzle graph is not planar")
+    outer = triangulate(embedding)
+    return tutte_layout(count, embedding.edges(), outer, center, radius)
+
+class Animation:
+    """Moves some of the nodes of a graph to target positions as t goes from 0 to 1."""
+
+    def __init__(self, nodes, indices, xs, ys):
+        self.nodes = nodes
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.start_xs = nodes.xs[self.indices].copy()
+        self.start_ys = nodes.ys[self.indices].copy()
+        self.end_xs = np.asarray(xs, dtype=np.float64)[self.indices]
+        self.end_ys = np.asarray(ys, dtype=np.float64)[self.indices]
+
+    def step(self, t):
+        """Move the nodes to where they are at time t, and return True once they have arrived."""
+        if t >= 1:
+            # Exactly on target, since the layout is only crossing-free there
+            self.nodes.xs[self.indices] = self.end_xs
+            self.nodes.ys[self.indices] = self.end_ys
+            return True
+        t = max(t, 0)
+        ease = t * t * (3 - 2 * t)
+        self.nodes.xs[self.indices] = self.start_xs + (self.end_xs - self.start_xs) * ease
+        self.nodes.ys[self.indices] = self.start_ys + (self.end_ys - self.start_ys) * ease
+        return False
+
+def hint(nodes, xs, ys, crossing_index, candidates=32):
+    """Return the index of a node worth moving to its place in the (xs, ys) layout, or None.
+
+    Of the nodes on crossing edges that are not in place yet, the ones with
+    the most crossings are tried, and the one whose move removes the most
+    crossings wins. Following every hint ends at the solved layout.
+    """
+    misplaced = (nodes.xs != xs) | (nodes.ys != ys)
+    if not misplaced.any():
+        return None
+    # Crossings per node: the crossings of every edge at it
+    crossings = np.bincount(crossing_index.ends.ravel(), weights=np.repeat(crossing_index.counts, 2),
+                            minlength=len(nodes)).astype(np.int64)
+    crossings[~misplaced] = 0
+    if not crossings.any():
+        # Nothing crosses, but the player asked, so carry on towards the layout
+        distance = np.hypot(nodes.xs - xs, nodes.ys - ys)
+        return int(np.argmax(distance))
+
+    best, best_gain = None, None
+    order = np.argsort(-crossings, kind='stable')[:candidates]
+    for index in order[crossings[order] > 0].tolist():
+        after = 0
+        for other in nodes.neighbours(index):
+            segment = (xs[index], ys[index], nodes.xs[other], nodes.ys[other])
+            after += int(kernels.segment_crossings(crossing_index.coords, crossing_index.ends,
+                                                   segment, (index, other)).sum())
+        gain = crossings[index] - after
+        if best_gain is None or gain > best_gain:
+            best, best_gain = index, gain
+    return best
+
+def check(counts, seeds, width, height, pool=None):
+    """Generate puzzles, solve each one and return the number whose layout still has crossings.
+
+    pool is an optional parallel.CrossingPool to check the layouts with.
+    """
+    failures = 0
+    for count in counts:
+        worst = 0
+        for seed in range(seeds):
+            nodes = core.generate_puzzle(count, width, height, seed)
+            start = time.perf_counter()
+            nodes.xs, nodes.ys = solve_layout(nodes, width, height)
+            worst = max(worst, time.perf_counter() - start)
+            if not core.is_solved(nodes, pool):
+                failures += 1
+                print(f"{count:>6} nodes, seed {seed}: solved layout has crossings", file=sys.stderr)
+        print(f"{count:>6} nodes: {seeds} puzzles solved, slowest {worst * 1000:.1f} ms", file=sys.stderr)
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that generated puzzles can be solved.")
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 30, 100, 300, 1000], help="node counts to check")
+    parser.add_argument('--seeds', type=int, default=20, help="puzzles per node count, seeded 0, 1, 2, ...")
+    parser.add_argument('--size', type=int, nargs=2, default=(1920, 1080), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--workers', type=int,
+                        help="check layouts on this many worker processes, worth it from tens of thousands of nodes")
+    args = parser.parse_args()
+    with CrossingPool(args.workers) as pool:
+        failures = check(args.counts, args.seeds, *args.size, pool if args.workers else None)
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
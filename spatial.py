@@ -0,0 +1,104 @@
+# Uniform grid over the play area, used to find the nodes under the mouse
+# and the edges that could possibly cross a given segment without scanning
+# the whole graph.
+
+class SpatialGrid:
+    """Buckets nodes by position and edges by the cells they pass through."""
+
+    def __init__(self, nodes, cell_size):
+        self.cell_size = cell_size
+        self.node_buckets = {}  # Cell -> list of nodes
+        self.edge_buckets = {}  # Cell -> set of edge keys
+        self.node_cells = {}  # Node index -> cell
+        self.edge_cells = {}  # Edge key -> list of cells
+        self.edges = {}  # Edge key -> (node, connected)
+        for node in nodes:
+            self.add_node(node)
+        for first, second in nodes.edges.tolist():
+            self.add_edge(nodes[first], nodes[second])
+
+    def _cell(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def _segment_cells(self, x1, y1, x2, y2):
+        """Return every cell touched by a segment.
+
+        Each grid column gets the bounding box of the part of the segment
+        inside it, which is much tighter than the whole bounding box for
+        long diagonal edges.
+        """
+        if x1 > x2:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        size = self.cell_size
+        slack = size * 1e-9  # Keep points on a cell border in both cells
+        cells = []
+        for column in range(int(x1 // size), int(x2 // size) + 1):
+            if x1 == x2:
+                low, high = y1, y2
+            else:
+                left = max(x1, column * size)
+                right = min(x2, (column + 1) * size)
+                low = y1 + (left - x1) * (y2 - y1) / (x2 - x1)
+                high = y1 + (right - x1) * (y2 - y1) / (x2 - x1)
+            if low > high:
+                low, high = high, low
+            for row in range(int((low - slack) // size), int((high + slack) // size) + 1):
+                cells.append((column, row))
+        return cells
+
+    def add_node(self, node):
+        cell = self._cell(node.x, node.y)
+        self.node_cells[node.index] = cell
+        self.node_buckets.setdefault(cell, []).append(node)
+
+    def add_edge(self, node1, node2):
+        key = (node1.index, node2.index) if node1.index < node2.index else (node2.index, node1.index)
+        cells = self._segment_cells(node1.x, node1.y, node2.x, node2.y)
+        self.edges[key] = (node1, node2)
+        self.edge_cells[key] = cells
+        for cell in cells:
+            self.edge_buckets.setdefault(cell, set()).add(key)
+
+    def _remove_edge(self, key):
+        for cell in self.edge_cells.pop(key):
+            bucket = self.edge_buckets[cell]
+            bucket.discard(key)
+            if not bucket:
+                del self.edge_buckets[cell]
+        return self.edges.pop(key)
+
+    def move_node(self, node):
+        """Re-bucket a node and its edges after its position has changed."""
+        cell = self._cell(node.x, node.y)
+        old_cell = self.node_cells[node.index]
+        if cell != old_cell:
+            self.node_buckets[old_cell].remove(node)
+            if not self.node_buckets[old_cell]:
+                del self.node_buckets[old_cell]
+            self.node_cells[node.index] = cell
+            self.node_buckets.setdefault(cell, []).append(node)
+        for connected in node.connections:
+            key = (node.index, connected.index) if node.index < connected.index else (connected.index, node.index)
+            if key in self.edges:
+                self.add_edge(*self._remove_edge(key))
+
+    def nodes_near(self, pos, radius):
+        """Return the nodes in every cell within radius of pos."""
+        x, y = pos
+        left, top = self._cell(x - radius, y - radius)
+        right, bottom = self._cell(x + radius, y + radius)
+        found = []
+        for column in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                found.extend(self.node_buckets.get((column, row), ()))
+        return found
+
+    def edge_candidates(self, x1, y1, x2, y2):
+        """Return the (node, connected) edges sharing a cell with a segment.
+
+        Every edge that crosses the segment is included.
+        """
+        keys = set()
+        for cell in self._segment_cells(x1, y1, x2, y2):
+            keys.update(self.edge_buckets.get(cell, ()))
+        return [self.edges[key] for key in keys]
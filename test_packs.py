@@ -0,0 +1,38 @@
+import numpy as np
+
+from crossings import crossing_counts
+from graph import Graph
+from packs import PuzzlePack, build_pack
+from prefetch import PuzzleQueue
+
+def _recounted(xs, ys, edges):
+    return crossing_counts(Graph.from_arrays(xs, ys, edges))
+
+def test_counts_match_the_layout_at_any_size(tmp_path):
+    path = str(tmp_path / 'test.pack')
+    build_pack(path, [30, 300], 2, 1024, 768, workers=1)
+    pack = PuzzlePack(path)
+    try:
+        for index in range(len(pack)):
+            xs, ys, edges, _, counts = pack.puzzle(index, 1024, 768)
+            assert np.array_equal(counts, _recounted(xs, ys, edges))
+            for size in ((1366, 768), (1280, 1024), (2560, 1440)):
+                assert pack.puzzle(index, *size)[4] is None
+
+        for size in ((1024, 768), (1366, 768), (2560, 1440)):
+            queue = PuzzleQueue(*size, workers=1, pack=pack)
+            try:
+                for count in (30, 300):
+                    xs, ys, edges, _, counts = queue.take(count).result()
+                    assert np.array_equal(counts, _recounted(xs, ys, edges))
+            finally:
+                queue.shutdown()
+    finally:
+        pack.close()
+
+def test_empty_pack(tmp_path):
+    path = str(tmp_path / 'empty.pack')
+    assert build_pack(path, [30], 0, 1024, 768, workers=1) == 0
+    pack = PuzzlePack(path)
+    assert len(pack) == 0 and 30 not in pack
+    pack.close()